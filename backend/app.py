@@ -1,33 +1,289 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Blueprint, Flask, Response, abort, current_app, jsonify, render_template, request, redirect, url_for, session, flash, stream_with_context
+from flask.cli import AppGroup
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError, OperationalError
+from werkzeug.exceptions import HTTPException
 from werkzeug.security import generate_password_hash, check_password_hash
+from cache import Cache
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from instrumentation import Instrumentation
+from numbering import BlockAllocator, FeistelPermutation, luhn_check_digit
+from itertools import islice, repeat
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN, ROUND_HALF_UP
+import click
+import csv
+import datetime
+import functools
+import io
+import json
 import os
-
-app = Flask(__name__, template_folder='../frontend/templates', static_folder='../frontend/static')
-app.config['SECRET_KEY'] = os.urandom(24)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///bank.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(app)
+import random
+import secrets
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import weakref
+
+# Defaults for every setting; create_app() layers BANK_SETTINGS, BANK_* variables and
+# its own `config` argument on top
+DEFAULT_CONFIG = dict(
+    # Signs session cookies, so every worker must use the same one. Left unset, a key is
+    # generated once and kept in instance/secret_key (see load_secret_key).
+    SECRET_KEY=None,
+    SQLALCHEMY_DATABASE_URI='sqlite:///bank.db', # DATABASE_URL overrides this
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    LOG_LEVEL='INFO',
+    # SQLite tuning, applied to every new connection
+    SQLITE_JOURNAL_MODE='WAL', # Readers don't block the writer
+    SQLITE_SYNCHRONOUS='NORMAL', # Safe with WAL; fsync at checkpoints rather than every commit
+    SQLITE_BUSY_TIMEOUT_MS=5000, # Wait this long for the write lock before "database is locked"
+    SQLITE_CACHE_SIZE_KB=64000, # Page cache per connection
+    # Connection pool for server databases such as PostgreSQL
+    DB_POOL_SIZE=10,
+    DB_MAX_OVERFLOW=20,
+    DB_POOL_TIMEOUT=30,
+    DB_POOL_RECYCLE=1800, # Seconds; stay under server/proxy idle timeouts
+    DB_POOL_PRE_PING=True,
+    # Read-through cache for dashboard/account pages: memory://, local:// or redis://host:6379/0.
+    # The memory backend is per process, so with several workers use redis:// to make
+    # invalidations visible everywhere (entries otherwise go stale for up to the TTL).
+    CACHE_URL='memory://',
+    CACHE_TTL_SECONDS=30,
+    CACHE_MAX_ENTRIES=10000,
+    STATS_ENABLED=False, # Serve /stats/cache
+    # Request/SQL/template timings and /metrics (see instrumentation.py)
+    INSTRUMENTATION_ENABLED=False,
+    N_PLUS_ONE_THRESHOLD=5, # Same SQL statement this many times in one request is flagged
+    PROFILE_SAMPLE_RATE=0.0, # Fraction of requests to cProfile
+    PROFILE_ON_DEMAND=False, # Let ?_profile=1 with the token below force a profile
+    INSTRUMENTATION_TOKEN=None, # Bearer token for /metrics and on-demand profiles; unset hides /metrics
+    # Password hashing. Changing the method rehashes each user's password at their next login.
+    PASSWORD_HASH_METHOD='scrypt:32768:8:1', # Any werkzeug method, e.g. 'pbkdf2:sha256:600000'
+    PASSWORD_HASH_WORKERS=min(4, os.cpu_count() or 1), # Hashing processes; 0 hashes in the request thread
+    # Background jobs (see "Background Jobs" below)
+    SCHEDULER_ENABLED=False,
+    SCHEDULER_POLL_SECONDS=60,
+    SCHEDULER_WORKERS=1,
+    JOB_THROTTLE_SECONDS=0.05, # Pause between batch chunks so jobs don't starve web requests
+    JOB_LOCK_TTL_SECONDS=6 * 60 * 60,
+    # Account and card numbers (see numbering.py). Changing the key after numbers have
+    # been issued is safe but gives up the no-collision guarantee for new numbers.
+    NUMBER_PERMUTATION_KEY=None, # Defaults to instance/number_permutation_key
+    NUMBER_BLOCK_SIZE=100, # Numbers reserved per database round trip, per process
+    CARD_IIN='400000', # 6-digit issuer prefix of every card number
+    # Transactions older than this move to per-month archive tables (see "Transaction Archive")
+    ARCHIVE_AFTER_DAYS=365,
+)
+
+def database_engine_options(config):
+    """Engine options for the configured database, merged under any explicit SQLALCHEMY_ENGINE_OPTIONS."""
+    if make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name() == 'sqlite':
+        # Python's sqlite3 timeout is its busy handler; pragmas are set in _configure_sqlite_connection
+        options = {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}}
+    else:
+        options = {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        }
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    return options
+
+def _configure_sqlite_connection(config, dbapi_connection, connection_record):
+    # Registered on each SQLite engine by create_app, with that app's config bound
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}")
+    cursor.execute(f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}")
+    cursor.execute(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    cursor.execute(f"PRAGMA cache_size={-int(config['SQLITE_CACHE_SIZE_KB'])}")
+    cursor.close()
+
+# Extensions and the blueprint for the HTML pages and CLI commands are created here
+# and bound to an app in create_app() (see "Application Factory")
+db = SQLAlchemy()
+cache = Cache()
+instrumentation = Instrumentation()
+bank = Blueprint('bank', __name__, cli_group=None)
+
+def describe_database():
+    """Effective database settings, as reported at startup and by `flask db-info`."""
+    engine = db.engine
+    info = {
+        'url': engine.url.render_as_string(hide_password=True),
+        'backend': engine.dialect.name,
+        'pool': type(engine.pool).__name__,
+    }
+    if hasattr(engine.pool, 'size'):
+        info['pool_size'] = engine.pool.size()
+        info['max_overflow'] = engine.pool._max_overflow
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as connection:
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size'):
+                info[pragma] = connection.exec_driver_sql(f'PRAGMA {pragma}').scalar()
+    else:
+        options = current_app.config['SQLALCHEMY_ENGINE_OPTIONS']
+        for option in ('pool_timeout', 'pool_recycle', 'pool_pre_ping'):
+            info[option] = options.get(option)
+    return info
+
+_database_reported = False
+
+@bank.before_app_request
+def _report_database_settings():
+    # Logged once per worker process, on its first request
+    global _database_reported
+    if not _database_reported:
+        _database_reported = True
+        settings = ', '.join(f'{key}={value}' for key, value in describe_database().items())
+        current_app.logger.info('Database settings (pid %s): %s', os.getpid(), settings)
+
+@bank.cli.command('db-info')
+def db_info_command():
+    """Show the effective database and connection pool settings."""
+    for key, value in describe_database().items():
+        click.echo(f'{key:>14}: {value}')
+
+# --- Time ---
+# Timestamps are naive UTC datetimes, set in Python rather than by CURRENT_TIMESTAMP:
+# SQLite would store those without microseconds, which compare unequal to the
+# same instant bound from Python and break keyset paging on (timestamp, id).
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+def utc_today():
+    return utcnow().date()
+
+# --- Money ---
+CENT = Decimal('0.01')
+
+def to_money(value):
+    """Convert a number or numeric string to a Decimal rounded to whole cents."""
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+# Largest amount a single movement may have; far below what integer cents can hold
+# (2**63 - 1), so balances built from many such movements still fit
+MAX_AMOUNT = Decimal('1000000000000.00')
+
+def parse_amount(value):
+    """Parse a user-entered amount; raises ValueError unless it is a whole-cent value up to MAX_AMOUNT."""
+    try:
+        amount = Decimal(value.strip())
+        if not amount.is_finite() or abs(amount) > MAX_AMOUNT:
+            raise ValueError(f'invalid amount: {value!r}')
+        if amount != amount.quantize(CENT, rounding=ROUND_HALF_UP):
+            raise ValueError(f'invalid amount: {value!r}')
+    except (InvalidOperation, AttributeError):
+        raise ValueError(f'invalid amount: {value!r}')
+    return amount.quantize(CENT)
+
+class Money(db.TypeDecorator):
+    """Stores amounts as integer cents and returns them as Decimal dollars."""
+    impl = db.Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return int(to_money(value) * 100)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        # Pre-migration SQLite files store whole cents in REAL columns, hence int()
+        return (Decimal(int(value)) / 100).quantize(CENT)
+
+# --- Password Hashing ---
+# Key derivation is deliberately slow, so it runs in a small process pool: login and
+# register requests wait for their hash without holding the GIL, and hashing
+# spreads across cores instead of pinning the web worker's threads.
+_hash_pool = None
+_hash_pool_slots = None
+_hash_pool_lock = threading.Lock()
+
+def _password_hash_pool():
+    global _hash_pool, _hash_pool_slots
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            import multiprocessing # Not needed until now
+            from concurrent.futures import ProcessPoolExecutor
+            workers = current_app.config['PASSWORD_HASH_WORKERS']
+            # Forking a threaded web worker copies locks other threads hold mid-request;
+            # a fork server starts the hashing processes from a clean single-threaded one
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _hash_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+            _hash_pool_slots = threading.BoundedSemaphore(workers * 4) # Cap the queued backlog
+        return _hash_pool, _hash_pool_slots
+
+def _run_password_kdf(func, *args, **kwargs):
+    if not current_app.config['PASSWORD_HASH_WORKERS']:
+        return func(*args, **kwargs)
+    pool, slots = _password_hash_pool()
+    with slots:
+        return pool.submit(func, *args, **kwargs).result()
+
+def shutdown_password_hashing():
+    """Stop the hashing processes; the pool is recreated on next use."""
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown()
+            _hash_pool = None
+
+def _forget_password_hash_pool():
+    # A forked child can't use its parent's pool (or a lock another thread held at the
+    # fork), so it starts without one and creates its own on first use
+    global _hash_pool, _hash_pool_slots, _hash_pool_lock
+    _hash_pool, _hash_pool_slots, _hash_pool_lock = None, None, threading.Lock()
+
+os.register_at_fork(after_in_child=_forget_password_hash_pool)
+
+def hash_password(password):
+    return _run_password_kdf(generate_password_hash, password, method=current_app.config['PASSWORD_HASH_METHOD'])
+
+def verify_password(password_hash, password):
+    return _run_password_kdf(check_password_hash, password_hash, password)
+
+def password_hash_prefix():
+    """The method prefix that hashes made with PASSWORD_HASH_METHOD start with.
+
+    Werkzeug records the full parameters, e.g. "scrypt:32768:8:1" for "scrypt", so the
+    prefix is read from a hash of an empty password, made once per app and method.
+    """
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    prefixes = current_app.extensions.setdefault('password_hash_prefixes', {})
+    if method not in prefixes:
+        prefixes[method] = hash_password('').split('$', 1)[0]
+    return prefixes[method]
 
 # --- Database Models ---
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False) # scrypt hashes are ~160 characters
     full_name = db.Column(db.String(120), nullable=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        # Werkzeug hashes look like "method$salt$hash"
+        return self.password_hash.split('$', 1)[0] != password_hash_prefix()
 
 class Account(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     account_number = db.Column(db.String(20), unique=True, nullable=False)
-    balance = db.Column(db.Float, default=0.0)
+    balance = db.Column(Money, default=Decimal('0.00'))
     account_type = db.Column(db.String(50), default='Savings') # e.g., Savings, Checking
     user = db.relationship('User', backref=db.backref('accounts', lazy=True))
 
@@ -35,49 +291,564 @@ class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
     type = db.Column(db.String(50), nullable=False) # e.g., deposit, withdrawal, transfer
-    amount = db.Column(db.Float, nullable=False)
-    timestamp = db.Column(db.DateTime, default=db.func.current_timestamp())
+    amount = db.Column(Money, nullable=False)
+    timestamp = db.Column(db.DateTime, default=utcnow)
     description = db.Column(db.String(200))
-    account = db.relationship('Account', backref=db.backref('transactions', lazy=True))
+    entry_id = db.Column(db.Integer, db.ForeignKey('journal_entry.id'), nullable=True) # Ledger entry behind this row
+    # History is only ever read a page at a time (paginate_transactions), never as a whole collection
+    account = db.relationship('Account', backref=db.backref('transactions', lazy='raise_on_sql'))
+
+    # History pages walk an account's transactions newest-first by (timestamp, id);
+    # this index lets them seek straight to a page instead of scanning and sorting.
+    # Ids are never reused on SQLite either, because archive_month matches hot rows
+    # to archived ones by id.
+    __table_args__ = (
+        db.Index('ix_transaction_account_timestamp_id', 'account_id', 'timestamp', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+
+class JournalEntry(db.Model):
+    # Append-only ledger: one entry per money movement, with postings that sum to zero
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False) # deposit, withdrawal, transfer, interest, opening
+    description = db.Column(db.String(200))
+    reference = db.Column(db.String(100), nullable=True) # e.g. the bulk transfer idempotency key or interest period
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+class Posting(db.Model):
+    # One side of a journal entry. Customer sides name an account; the bank's own side
+    # (cash, interest expense, ...) names a ledger code instead. Amounts are signed:
+    # a positive posting adds to the account's balance.
+    id = db.Column(db.Integer, primary_key=True)
+    entry_id = db.Column(db.Integer, db.ForeignKey('journal_entry.id'), nullable=False, index=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=True)
+    ledger_code = db.Column(db.String(20), nullable=True)
+    amount = db.Column(Money, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    # Balance rebuilds and point-in-time balances read (account, time, amount) from the
+    # index alone, without visiting the table
+    __table_args__ = (
+        db.Index('ix_posting_account_created', 'account_id', 'created_at', 'amount'),
+    )
+
+# Ledger rows are never changed once written; the database enforces it where it can
+_LEDGER_FUNCTION_DDL = db.DDL("""
+CREATE OR REPLACE FUNCTION ledger_append_only() RETURNS trigger AS $$
+BEGIN
+    RAISE EXCEPTION '% is append-only', TG_TABLE_NAME;
+END
+$$ LANGUAGE plpgsql""")
+event.listen(JournalEntry.__table__, 'before_create', _LEDGER_FUNCTION_DDL.execute_if(dialect='postgresql'))
+for _ledger_table in (JournalEntry.__table__, Posting.__table__):
+    for _operation in ('UPDATE', 'DELETE'):
+        _trigger = f'{_ledger_table.name}_no_{_operation.lower()}'
+        event.listen(_ledger_table, 'after_create', db.DDL(
+            f"CREATE TRIGGER {_trigger} BEFORE {_operation} ON {_ledger_table.name} "
+            f"BEGIN SELECT RAISE(ABORT, '{_ledger_table.name} is append-only'); END"
+        ).execute_if(dialect='sqlite'))
+        event.listen(_ledger_table, 'after_create', db.DDL(
+            f"CREATE TRIGGER {_trigger} BEFORE {_operation} ON {_ledger_table.name} "
+            f"FOR EACH ROW EXECUTE FUNCTION ledger_append_only()"
+        ).execute_if(dialect='postgresql'))
+
+class InterestRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(7), unique=True, nullable=False) # YYYY-MM
+    last_account_id = db.Column(db.Integer, default=0, nullable=False) # Resume checkpoint
+    accounts_processed = db.Column(db.Integer, default=0, nullable=False)
+    total_interest = db.Column(Money, default=Decimal('0.00'), nullable=False)
+    started_at = db.Column(db.DateTime, default=utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class BalanceSnapshot(db.Model):
+    # End-of-day balance per account, so statements and reconciliations only need
+    # the transactions after the nearest snapshot instead of the whole history
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    balance = db.Column(Money, nullable=False)
+
+class ArchiveMonth(db.Model):
+    # A calendar month whose transactions were moved to their own archive table
+    month = db.Column(db.String(7), primary_key=True) # YYYY-MM
+    table_name = db.Column(db.String(40), nullable=False)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, default=utcnow)
+
+class MonthlyRollup(db.Model):
+    # Per-account totals of an archived month. History pages use these rows to find the
+    # archive tables an account has rows in; balances use the totals instead of the rows.
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True) # YYYY-MM
+    transaction_count = db.Column(db.Integer, nullable=False)
+    credits = db.Column(Money, nullable=False)
+    debits = db.Column(Money, nullable=False)
+
+class SchemaMigration(db.Model):
+    name = db.Column(db.String(80), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=utcnow)
+
+class IdempotentTransfer(db.Model):
+    # One row per transfer applied from a bulk file, keyed by the submitter's idempotency
+    # key within the source account, so customers can't collide with each other's keys
+    from_account_id = db.Column(db.Integer, db.ForeignKey('account.id'), primary_key=True)
+    idempotency_key = db.Column(db.String(100), primary_key=True)
+    to_account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
+    amount = db.Column(Money, nullable=False)
+    created_at = db.Column(db.DateTime, default=utcnow)
+
+class JobLock(db.Model):
+    name = db.Column(db.String(80), primary_key=True)
+    owner = db.Column(db.String(120), nullable=False) # host:pid:thread of the holder
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class JobRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_name = db.Column(db.String(80), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='running') # running, succeeded, failed
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True)
+    detail = db.Column(db.String(500))
+
+class NumberSequence(db.Model):
+    # Next unreserved value of each number sequence; processes reserve blocks from it
+    name = db.Column(db.String(40), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False, default=0)
 
 class Card(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False, index=True)
     card_number = db.Column(db.String(16), unique=True, nullable=False)
     expiry_date = db.Column(db.String(5), nullable=False) # MM/YY
     cvv = db.Column(db.String(3), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
-    account = db.relationship('Account', backref=db.backref('cards', lazy=True))
+    account = db.relationship('Account', backref=db.backref('cards', lazy=True, order_by='Card.id'))
 
 # --- Helper Functions ---
+ACCOUNT_NUMBER_PREFIX = '1'
+ACCOUNT_NUMBER_DIGITS = 8 # Between the prefix and the Luhn check digit
+CARD_NUMBER_DIGITS = 9 # Between the IIN and the Luhn check digit
+NUMBER_CHECK_BATCH = 500 # Candidates checked against existing numbers per query
+
+def reserve_number_block(name, size):
+    """Atomically reserve `size` values of sequence `name`; returns the first one."""
+    table = NumberSequence.__table__
+    # A connection of its own, so the reservation commits even if the caller's transaction rolls back
+    with db.engine.begin() as connection:
+        start = connection.execute(
+            table.update().where(table.c.name == name)
+            .values(next_value=table.c.next_value + size)
+            .returning(table.c.next_value)
+        ).scalar()
+        if start is not None:
+            return start - size
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(table.insert().values(name=name, next_value=size))
+        return 0
+    except IntegrityError: # Another process created the sequence first
+        return reserve_number_block(name, size)
+
+def init_numbering(app):
+    """Set up the app's number allocator and permutations from its NUMBER_* settings."""
+    key = app.config['NUMBER_PERMUTATION_KEY']
+    app.extensions['numbering'] = {
+        'allocator': BlockAllocator(reserve_number_block, block_size=app.config['NUMBER_BLOCK_SIZE']),
+        'account': FeistelPermutation(f'account:{key}', 10 ** ACCOUNT_NUMBER_DIGITS),
+        'card': FeistelPermutation(f'card:{key}', 10 ** CARD_NUMBER_DIGITS),
+    }
+
+def _allocate_unique_numbers(sequence, count, column, build):
+    # Sequence values never repeat, so the only possible clashes are numbers issued
+    # before the allocator existed; those are skipped with one IN query per batch.
+    allocator = current_app.extensions['numbering']['allocator']
+    numbers = []
+    while len(numbers) < count:
+        candidates = [build(value) for value in allocator.allocate(sequence, min(count - len(numbers), NUMBER_CHECK_BATCH))]
+        taken = set(db.session.execute(db.select(column).where(column.in_(candidates))).scalars())
+        numbers.extend(number for number in candidates if number not in taken)
+    return numbers
+
+def _account_number(value):
+    permutation = current_app.extensions['numbering']['account']
+    body = ACCOUNT_NUMBER_PREFIX + f'{permutation.permute(value):0{ACCOUNT_NUMBER_DIGITS}d}'
+    return body + luhn_check_digit(body)
+
+def _card_number(value):
+    permutation = current_app.extensions['numbering']['card']
+    body = current_app.config['CARD_IIN'] + f'{permutation.permute(value):0{CARD_NUMBER_DIGITS}d}'
+    return body + luhn_check_digit(body)
+
+# Allocate before writing anything in the current transaction: blocks are reserved
+# on a separate connection, which SQLite would make wait for the session's write lock.
+def allocate_account_numbers(count):
+    return _allocate_unique_numbers('account_number', count, Account.account_number, _account_number)
+
+def allocate_card_numbers(count):
+    return _allocate_unique_numbers('card_number', count, Card.card_number, _card_number)
+
 def generate_account_number():
-    import random
-    return str(random.randint(1000000000, 9999999999))
+    return allocate_account_numbers(1)[0]
+
+def generate_card_expiry():
+    # Expires at a random month 3-5 years out, so it is always in the future
+    today = utc_today()
+    exp_year = (today.year + 3 + secrets.randbelow(3)) % 100
+    exp_month = 1 + secrets.randbelow(12)
+    return f"{exp_month:02d}/{exp_year:02d}"
+
+def generate_cvv():
+    return f'{secrets.randbelow(1000):03d}'
 
 def generate_card_details():
-    import random, datetime
-    card_number = ''.join([str(random.randint(0, 9)) for _ in range(16)])
-    # Ensure expiry is in the future
-    current_year = datetime.date.today().year % 100 # last two digits
-    current_month = datetime.date.today().month
-    exp_year = current_year + random.randint(3, 5) # Expires in 3-5 years
-    exp_month = random.randint(1, 12)
-    # If expiring this year, ensure month is ahead
-    if exp_year == current_year and exp_month <= current_month:
-        exp_month = random.randint(current_month + 1, 12) if current_month < 12 else current_month # avoid issues with december
-
-    expiry_date = f"{exp_month:02d}/{exp_year:02d}"
-    cvv = ''.join([str(random.randint(0, 9)) for _ in range(3)])
-    return card_number, expiry_date, cvv
+    return allocate_card_numbers(1)[0], generate_card_expiry(), generate_cvv()
+
+TRANSACTIONS_PAGE_SIZE = 25
+TRANSACTIONS_MAX_PAGE_SIZE = 100
+HISTORY_COLUMNS = ('id', 'timestamp', 'type', 'amount', 'description')
+
+def encode_transaction_cursor(transaction):
+    return f"{transaction.timestamp.isoformat()}_{transaction.id}"
+
+def decode_transaction_cursor(cursor):
+    """Parse a history cursor into (timestamp, id); raises ValueError if malformed."""
+    timestamp, _, tx_id = cursor.rpartition('_')
+    return datetime.datetime.fromisoformat(timestamp), int(tx_id)
+
+def parse_history_filters(args):
+    """Read the optional start/end date and type filters from the query string."""
+    filters = {'start': None, 'end': None, 'type': args.get('type') or None}
+    for key in ('start', 'end'):
+        value = args.get(key)
+        if value:
+            filters[key] = datetime.date.fromisoformat(value)
+    return filters
+
+def transaction_history_conditions(account_id, filters, columns=Transaction):
+    """WHERE conditions for an account's history; `columns` is Transaction or an archive table's `.c`."""
+    conditions = [columns.account_id == account_id]
+    if filters['start']:
+        conditions.append(columns.timestamp >= datetime.datetime.combine(filters['start'], datetime.time.min))
+    if filters['end']:
+        # End date is inclusive, so compare against the start of the following day
+        end = datetime.datetime.combine(filters['end'] + datetime.timedelta(days=1), datetime.time.min)
+        conditions.append(columns.timestamp < end)
+    if filters['type']:
+        conditions.append(columns.type == filters['type'])
+    return conditions
+
+def history_rows(columns, account_id, filters, limit, cursor=None, newer=False):
+    """Up to `limit` history rows from one table, newest first, or oldest first past
+    `cursor` when `newer` is set. `cursor` is a decoded (timestamp, id) pair."""
+    query = (db.select(*(getattr(columns, name) for name in HISTORY_COLUMNS))
+             .where(*transaction_history_conditions(account_id, filters, columns)))
+    if cursor:
+        ts, tx_id = cursor
+        if newer:
+            query = query.where(db.or_(columns.timestamp > ts, db.and_(columns.timestamp == ts, columns.id > tx_id)))
+        else:
+            query = query.where(db.or_(columns.timestamp < ts, db.and_(columns.timestamp == ts, columns.id < tx_id)))
+    if newer:
+        query = query.order_by(columns.timestamp.asc(), columns.id.asc())
+    else:
+        query = query.order_by(columns.timestamp.desc(), columns.id.desc())
+    return db.session.execute(query.limit(limit)).all()
+
+def paginate_transactions(account_id, filters, page_size, before=None, after=None):
+    """Return one page of history, newest first, using keyset pagination on (timestamp, id).
+
+    `before` pages towards older transactions and `after` towards newer ones; both are
+    cursors produced by encode_transaction_cursor. Returns (transactions, older_cursor,
+    newer_cursor) where a cursor is None if there is nothing further in that direction.
+
+    Pages are read from the hot transaction table. Only a page that runs past its
+    oldest row looks up the account's archived months and continues in their archive
+    tables (see Transaction Archive), which all hold older rows than the hot table.
+    """
+    limit = page_size + 1
+    if after:
+        cursor = decode_transaction_cursor(after)
+        rows = []
+        for month in archived_months(account_id, filters):
+            if month >= cursor[0].strftime('%Y-%m') and len(rows) < limit:
+                rows += history_rows(archive_table(month).c, account_id, filters, limit - len(rows), cursor, newer=True)
+        if len(rows) < limit:
+            rows += history_rows(Transaction, account_id, filters, limit - len(rows), cursor, newer=True)
+        has_newer = len(rows) > page_size
+        transactions = list(reversed(rows[:page_size]))
+        has_older = True
+    else:
+        cursor = decode_transaction_cursor(before) if before else None
+        rows = history_rows(Transaction, account_id, filters, limit, cursor)
+        if len(rows) < limit:
+            for month in reversed(archived_months(account_id, filters)):
+                if (cursor is None or month <= cursor[0].strftime('%Y-%m')) and len(rows) < limit:
+                    rows += history_rows(archive_table(month).c, account_id, filters, limit - len(rows), cursor)
+        has_older = len(rows) > page_size
+        transactions = rows[:page_size]
+        has_newer = before is not None
+
+    if not transactions:
+        return [], None, None
+    older_cursor = encode_transaction_cursor(transactions[-1]) if has_older else None
+    newer_cursor = encode_transaction_cursor(transactions[0]) if has_newer else None
+    return transactions, older_cursor, newer_cursor
+
+# --- Ledger ---
+# Every change to a balance is also written as a journal entry with postings, so any
+# balance can be recomputed as the sum of its account's postings (see ledger-rebuild).
+LEDGER_CASH = 'cash' # Deposits and withdrawals
+LEDGER_INTEREST = 'interest_expense'
+LEDGER_PROMOTIONS = 'promotions' # Sign-up and new-account bonuses
+LEDGER_OPENING = 'opening_balance' # Balances that predate the ledger
+
+def post_entries(entries):
+    """Append journal entries and their postings; returns the new entry ids in order.
+
+    Each entry is a dict with kind, description, an optional reference and postings, a
+    list of (account_id, ledger_code, amount) tuples that must sum to zero. Entries and
+    postings are written with one executemany each.
+    """
+    for entry in entries:
+        if sum(amount for _, _, amount in entry['postings']) != 0:
+            raise ValueError(f"unbalanced {entry['kind']} journal entry")
+    # Core inserts, so rows with and without a reference or account still go in one batch
+    entry_table, posting_table = JournalEntry.__table__, Posting.__table__
+    entry_ids = db.session.execute(
+        db.insert(entry_table).returning(entry_table.c.id, sort_by_parameter_order=True),
+        [{'kind': entry['kind'], 'description': entry['description'], 'reference': entry.get('reference')}
+         for entry in entries]
+    ).scalars().all()
+    db.session.execute(db.insert(posting_table), [
+        {'entry_id': entry_id, 'account_id': account_id, 'ledger_code': ledger_code, 'amount': amount}
+        for entry_id, entry in zip(entry_ids, entries)
+        for account_id, ledger_code, amount in entry['postings']
+    ])
+    return entry_ids
+
+def post_entry(kind, description, postings, reference=None):
+    return post_entries([{'kind': kind, 'description': description, 'reference': reference, 'postings': postings}])[0]
+
+def record_opening_balance(account_id, amount, ledger_code=LEDGER_PROMOTIONS, description='Opening balance'):
+    """Post the balance a new account starts with; call after flushing the account."""
+    if amount:
+        post_entry('opening', description, [(account_id, None, amount), (None, ledger_code, -amount)])
+
+# --- Money Movement ---
+# Balances are only ever changed with single conditional UPDATE statements, so
+# concurrent requests can't lose each other's updates and an overdraft check can't
+# race with a withdrawal in another worker.
+DB_RETRY_ATTEMPTS = 5
+DB_RETRY_BASE_DELAY = 0.02 # Seconds; doubled on each retry, with jitter
+
+def _is_busy_error(exc):
+    message = str(exc.orig).lower()
+    sqlstate = getattr(exc.orig, 'pgcode', None) or getattr(exc.orig, 'sqlstate', None)
+    # SQLite lock contention, or PostgreSQL serialization failure / deadlock
+    return 'database is locked' in message or 'database table is locked' in message or sqlstate in ('40001', '40P01')
+
+def run_in_transaction(operation, attempts=DB_RETRY_ATTEMPTS):
+    """Call operation() and commit, retrying with exponential backoff while the database is busy."""
+    for attempt in range(attempts):
+        try:
+            result = operation()
+            db.session.commit()
+            return result
+        except OperationalError as exc:
+            db.session.rollback()
+            if attempt == attempts - 1 or not _is_busy_error(exc):
+                raise
+            time.sleep(DB_RETRY_BASE_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+
+_account_table = Account.__table__
+_credit_statement = db.update(_account_table).where(
+    _account_table.c.id == db.bindparam('b_account_id')
+).values(balance=_account_table.c.balance + db.bindparam('b_amount'))
+_debit_statement = db.update(_account_table).where(
+    _account_table.c.id == db.bindparam('b_account_id'),
+    _account_table.c.balance >= db.bindparam('b_amount'),
+).values(balance=_account_table.c.balance - db.bindparam('b_amount'))
+_lock_statement = db.select(_account_table.c.id).where(
+    _account_table.c.id.in_(db.bindparam('b_account_ids', expanding=True))
+).order_by(_account_table.c.id).with_for_update()
+
+def credit_account(account_id, amount):
+    db.session.execute(_credit_statement, {'b_account_id': account_id, 'b_amount': amount})
+
+def debit_account(account_id, amount):
+    """Subtract amount if the balance covers it. Returns False (and changes nothing) otherwise."""
+    result = db.session.execute(_debit_statement, {'b_account_id': account_id, 'b_amount': amount})
+    return result.rowcount == 1
+
+def record_deposit(account, amount, description='User deposit'):
+    credit_account(account.id, amount)
+    entry_id = post_entry('deposit', description, [(account.id, None, amount), (None, LEDGER_CASH, -amount)])
+    db.session.add(Transaction(account_id=account.id, type='deposit', amount=amount, description=description,
+                               entry_id=entry_id))
+    return True
+
+def record_withdrawal(account, amount, description='User withdrawal'):
+    if not debit_account(account.id, amount):
+        return False
+    entry_id = post_entry('withdrawal', description, [(account.id, None, -amount), (None, LEDGER_CASH, amount)])
+    db.session.add(Transaction(account_id=account.id, type='withdrawal', amount=amount, description=description,
+                               entry_id=entry_id))
+    return True
+
+def move_funds(from_account_id, to_account_id, amount):
+    """Debit one account and credit another. Returns False if the source can't cover it."""
+    # Lock both rows in id order so two opposite transfers can't deadlock on servers
+    # with row locks (SQLite ignores FOR UPDATE and locks the whole database instead)
+    db.session.execute(_lock_statement, {'b_account_ids': [from_account_id, to_account_id]}).all()
+    if not debit_account(from_account_id, amount):
+        return False
+    credit_account(to_account_id, amount)
+    return True
+
+def transfer_postings(from_account, to_account, amount):
+    return [(from_account.id, None, -amount), (to_account.id, None, amount)]
+
+def transfer_transaction_rows(from_account, to_account, amount, description, entry_id=None):
+    return [
+        dict(
+            account_id=from_account.id,
+            type='transfer_out',
+            amount=amount,
+            description=f'Transfer to {to_account.account_number} - {description}',
+            entry_id=entry_id
+        ),
+        dict(
+            account_id=to_account.id,
+            type='transfer_in',
+            amount=amount,
+            description=f'Transfer from {from_account.account_number} - {description}',
+            entry_id=entry_id
+        ),
+    ]
+
+def record_transfer(from_account, to_account, amount, description):
+    """Move amount between two accounts. Returns False if the source can't cover it."""
+    if not move_funds(from_account.id, to_account.id, amount):
+        return False
+    entry_id = post_entry('transfer', description, transfer_postings(from_account, to_account, amount))
+    db.session.execute(db.insert(Transaction),
+                       transfer_transaction_rows(from_account, to_account, amount, description, entry_id))
+    return True
+
+# --- Caching ---
+# The user's name and account list/balances are read on nearly every page, so they
+# are cached per user and invalidated by every write path that changes them.
+UserSummary = namedtuple('UserSummary', 'id username full_name')
+AccountSummary = namedtuple('AccountSummary', 'id account_number account_type balance user_id')
+
+def _user_cache_key(user_id):
+    return f'user:{user_id}:summary'
+
+def get_user_summary(user_id):
+    """Return (UserSummary, [AccountSummary]) for a user, or (None, []) if there is no such user."""
+    key = _user_cache_key(user_id)
+    summary = cache.get(key)
+    if summary is None:
+        user = db.session.execute(
+            db.select(User.id, User.username, User.full_name).where(User.id == user_id)
+        ).first()
+        if user is None:
+            return None, []
+        accounts = db.session.execute(
+            db.select(Account.id, Account.account_number, Account.account_type, Account.balance, Account.user_id)
+            .where(Account.user_id == user_id).order_by(Account.id)
+        ).all()
+        summary = (UserSummary(*user), [AccountSummary(*account) for account in accounts])
+        cache.set(key, summary)
+    return summary
+
+def get_account_summary(user_id, account_id):
+    """The user's account with this id, or None if it doesn't exist or belongs to someone else."""
+    _, accounts = get_user_summary(user_id)
+    return next((account for account in accounts if account.id == account_id), None)
+
+def invalidate_user_cache(*user_ids):
+    # Call after the commit, so a concurrent reader can't re-cache the old values
+    cache.delete(*(_user_cache_key(user_id) for user_id in set(user_ids)))
+
+@bank.route('/stats/cache')
+def cache_stats():
+    if not current_app.config['STATS_ENABLED']:
+        abort(404)
+    return jsonify(cache.stats())
+
+# --- Account Access ---
+# Account pages and actions look up "this user's account" through these helpers, so
+# ownership is checked in the same query that loads the account. Pages that only show
+# the account itself use the cached summary; pages that need related rows load them
+# in the same round trip with loader options.
+def get_owned_account(user_id, account_id, *options):
+    """The user's Account, or None if it doesn't exist or belongs to someone else.
+
+    Pass loader options such as db.joinedload(Account.cards) to fetch related rows
+    in the same query.
+    """
+    query = db.select(Account).where(Account.id == account_id, Account.user_id == user_id).options(*options)
+    return db.session.execute(query).unique().scalar_one_or_none()
+
+def owned_account_summary_or_404(user_id, account_id):
+    account = get_account_summary(user_id, account_id)
+    if account is None:
+        abort(404)
+    return account
+
+def find_account_by_number(account_number):
+    """(id, account_number, user_id) of any account with this number, or None."""
+    return db.session.execute(
+        db.select(Account.id, Account.account_number, Account.user_id).where(Account.account_number == account_number)
+    ).first()
+
+def count_user_accounts(user_id, account_type):
+    """(accounts of this type, accounts in total) for the user, counted in one query."""
+    same_type, total = db.session.execute(
+        db.select(db.func.count(db.case((Account.account_type == account_type, 1))), db.func.count(Account.id))
+        .where(Account.user_id == user_id)
+    ).one()
+    return same_type, total
+
+def count_active_cards(account_id):
+    return db.session.execute(
+        db.select(db.func.count(Card.id)).where(Card.account_id == account_id, Card.is_active.is_(True))
+    ).scalar()
+
+# --- Instrumentation ---
+def _cache_metrics():
+    stats = cache.stats()
+    return [
+        '# HELP bank_cache_hits_total Account summary cache hits in this process.',
+        '# TYPE bank_cache_hits_total counter',
+        f"bank_cache_hits_total {stats['hits']}",
+        '# HELP bank_cache_misses_total Account summary cache misses in this process.',
+        '# TYPE bank_cache_misses_total counter',
+        f"bank_cache_misses_total {stats['misses']}",
+    ]
+
+instrumentation.add_collector(_cache_metrics) # Served once create_app enables instrumentation
 
 # --- Routes ---
-@app.route('/')
+def authenticate(username, password):
+    """The user with these credentials, or None. Upgrades the stored hash if the method changed."""
+    user = User.query.filter_by(username=username).first()
+    if not user or not user.check_password(password):
+        return None
+    if user.password_needs_rehash():
+        user.set_password(password)
+        db.session.commit()
+    return user
+
+@bank.route('/')
 def index():
     if 'user_id' in session:
-        return redirect(url_for('dashboard'))
-    return redirect(url_for('login'))
+        return redirect(url_for('bank.dashboard'))
+    return redirect(url_for('bank.login'))
 
-@app.route('/register', methods=['GET', 'POST'])
+@bank.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
@@ -99,39 +870,44 @@ def register():
             user_id=new_user.id,
             account_number=generate_account_number(),
             account_type='Savings',
-            balance=1000.0 # Starting balance for new users
+            balance=Decimal('1000.00') # Starting balance for new users
         )
         db.session.add(new_account)
+        db.session.flush()
+        record_opening_balance(new_account.id, new_account.balance)
         db.session.commit()
 
         flash('Registration successful! Please log in.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('bank.login'))
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@bank.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
+        user = authenticate(username, password)
+        if user:
             session['user_id'] = user.id
             session['username'] = user.username
             flash(f'Welcome back, {user.username}!', 'success')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('bank.dashboard'))
         else:
             flash('Invalid username or password.', 'error')
             return render_template('login.html')
     return render_template('login.html')
 
-@app.route('/dashboard')
+@bank.route('/dashboard')
 def dashboard():
     if 'user_id' not in session:
         flash('Please log in to access the dashboard.', 'info')
-        return redirect(url_for('login'))
+        return redirect(url_for('bank.login'))
     
-    user = db.session.get(User, session['user_id'])
-    accounts = Account.query.filter_by(user_id=user.id).all()
+    user, accounts = get_user_summary(session['user_id'])
+    if user is None:
+        flash('User not found. Please log in again.', 'error')
+        session.clear()
+        return redirect(url_for('bank.login'))
 
     if not accounts:
         # This case should ideally not happen if an account is created upon registration
@@ -142,121 +918,132 @@ def dashboard():
     # For now, let's always show the overview.
     return render_template('dashboard_overview.html', user=user, accounts=accounts)
 
-@app.route('/account/<int:account_id>')
+@bank.route('/account/<int:account_id>')
 def account_details(account_id):
     if 'user_id' not in session:
         flash('Please log in.', 'info')
-        return redirect(url_for('login'))
+        return redirect(url_for('bank.login'))
 
-    account = Account.query.filter_by(id=account_id, user_id=session['user_id']).first_or_404()
-    # In a real app, you might want more specific error handling or a custom 404 page.
-    # For now, first_or_404() will raise a Werkzeug NotFound exception if no account is found
-    # or if the account doesn't belong to the logged-in user.
+    account = get_account_summary(session['user_id'], account_id)
+    if account is None:
+        # In a real app, you might want more specific error handling or a custom 404 page.
+        abort(404)
 
     return render_template('account_detail.html', account=account)
 
-@app.route('/account/<int:account_id>/transactions')
+@bank.route('/account/<int:account_id>/transactions')
 def account_transactions(account_id):
     if 'user_id' not in session:
         flash('Please log in.', 'info')
-        return redirect(url_for('login'))
+        return redirect(url_for('bank.login'))
 
-    account = Account.query.filter_by(id=account_id, user_id=session['user_id']).first_or_404()
-    transactions = Transaction.query.filter_by(account_id=account.id).order_by(Transaction.timestamp.desc()).all()
-    return render_template('account_transactions.html', account=account, transactions=transactions)
-
-@app.route('/account/<int:account_id>/cards')
+    account = owned_account_summary_or_404(session['user_id'], account_id)
+    page_size = request.args.get('limit', TRANSACTIONS_PAGE_SIZE, type=int)
+    page_size = max(1, min(page_size, TRANSACTIONS_MAX_PAGE_SIZE))
+    try:
+        filters = parse_history_filters(request.args)
+        transactions, older_cursor, newer_cursor = paginate_transactions(
+            account.id, filters, page_size,
+            before=request.args.get('before'), after=request.args.get('after'))
+    except ValueError:
+        flash('Invalid transaction filter or page.', 'error')
+        return redirect(url_for('bank.account_transactions', account_id=account.id))
+
+    # Carry the active filters across older/newer page links
+    page_args = {key: value for key, value in request.args.items() if key in ('start', 'end', 'type') and value}
+    if page_size != TRANSACTIONS_PAGE_SIZE:
+        page_args['limit'] = page_size
+    return render_template('account_transactions.html', account=account, transactions=transactions,
+                           filters=filters, page_args=page_args,
+                           older_cursor=older_cursor, newer_cursor=newer_cursor)
+
+@bank.route('/account/<int:account_id>/cards')
 def account_cards(account_id):
     if 'user_id' not in session:
         flash('Please log in.', 'info')
-        return redirect(url_for('login'))
+        return redirect(url_for('bank.login'))
     
-    account = Account.query.filter_by(id=account_id, user_id=session['user_id']).first_or_404()
-    cards = Card.query.filter_by(account_id=account.id).all()
-    return render_template('account_cards.html', account=account, cards=cards)
+    account = get_owned_account(session['user_id'], account_id, db.joinedload(Account.cards))
+    if account is None:
+        abort(404)
+    return render_template('account_cards.html', account=account, cards=account.cards)
 
-@app.route('/logout')
+@bank.route('/logout')
 def logout():
     session.pop('user_id', None)
     session.pop('username', None)
-    return redirect(url_for('login'))
+    return redirect(url_for('bank.login'))
 
-@app.route('/deposit', methods=['POST'])
+@bank.route('/deposit', methods=['POST'])
 def deposit():
     if 'user_id' not in session:
         flash('Please log in to make a deposit.', 'info')
-        return redirect(url_for('login'))
+        return redirect(url_for('bank.login'))
 
     try:
-        amount = float(request.form['amount'])
+        amount = parse_amount(request.form['amount'])
         account_id = int(request.form['account_id'])
     except ValueError:
         flash('Invalid amount or account ID.', 'error')
-        return redirect(request.referrer or url_for('dashboard'))
+        return redirect(request.referrer or url_for('bank.dashboard'))
 
     if amount <= 0:
         flash('Deposit amount must be positive.', 'error')
-        return redirect(request.referrer or url_for('account_details', account_id=account_id))
+        return redirect(request.referrer or url_for('bank.account_details', account_id=account_id))
 
-    account = db.session.get(Account, account_id)
-    if account and account.user_id == session['user_id']:
-        account.balance += amount
-        new_transaction = Transaction(account_id=account.id, type='deposit', amount=amount, description='User deposit')
-        db.session.add(new_transaction)
-        db.session.commit()
+    account = get_account_summary(session['user_id'], account_id)
+    if account:
+        run_in_transaction(lambda: record_deposit(account, amount))
+        invalidate_user_cache(account.user_id)
         flash(f'${amount:.2f} deposited successfully to account {account.account_number}.', 'success')
     else:
         flash('Account not found or you do not have permission to access it.', 'error')
     
-    return redirect(url_for('account_details', account_id=account_id))
+    return redirect(url_for('bank.account_details', account_id=account_id))
 
-@app.route('/withdraw', methods=['POST'])
+@bank.route('/withdraw', methods=['POST'])
 def withdraw():
     if 'user_id' not in session:
         flash('Please log in to make a withdrawal.', 'info')
-        return redirect(url_for('login'))
+        return redirect(url_for('bank.login'))
 
     try:
-        amount = float(request.form['amount'])
+        amount = parse_amount(request.form['amount'])
         account_id = int(request.form['account_id'])
     except ValueError:
         flash('Invalid amount or account ID.', 'error')
-        return redirect(request.referrer or url_for('dashboard'))
+        return redirect(request.referrer or url_for('bank.dashboard'))
 
     if amount <= 0:
         flash('Withdrawal amount must be positive.', 'error')
-        return redirect(request.referrer or url_for('account_details', account_id=account_id))
-
-    account = db.session.get(Account, account_id)
-    if account and account.user_id == session['user_id']:
-        if account.balance >= amount:
-            account.balance -= amount
-            new_transaction = Transaction(account_id=account.id, type='withdrawal', amount=amount, description='User withdrawal')
-            db.session.add(new_transaction)
-            db.session.commit()
+        return redirect(request.referrer or url_for('bank.account_details', account_id=account_id))
+
+    account = get_account_summary(session['user_id'], account_id)
+    if account:
+        if run_in_transaction(lambda: record_withdrawal(account, amount)):
+            invalidate_user_cache(account.user_id)
             flash(f'${amount:.2f} withdrawn successfully from account {account.account_number}.', 'success')
         else:
             flash('Insufficient funds.', 'error')
     else:
         flash('Account not found or you do not have permission to access it.', 'error')
     
-    return redirect(url_for('account_details', account_id=account_id))
+    return redirect(url_for('bank.account_details', account_id=account_id))
 
-@app.route('/issue_card', methods=['POST'])
+@bank.route('/issue_card', methods=['POST'])
 def issue_card():
     if 'user_id' not in session:
         flash('Please log in to issue a card.', 'info')
-        return redirect(url_for('login'))
+        return redirect(url_for('bank.login'))
 
     account_id = int(request.form['account_id'])
-    account = db.session.get(Account, account_id)
+    account = get_account_summary(session['user_id'], account_id)
 
-    if account and account.user_id == session['user_id']:
-        # Basic check: limit to 3 cards per account for simplicity
-        existing_cards_count = Card.query.filter_by(account_id=account.id).count()
-        if existing_cards_count >= 3:
+    if account:
+        # Basic check: limit to 3 active cards per account for simplicity
+        if count_active_cards(account.id) >= 3:
             flash('You have reached the maximum number of cards for this account.', 'warning')
-            return redirect(url_for('account_cards', account_id=account_id))
+            return redirect(url_for('bank.account_cards', account_id=account_id))
 
         card_number, expiry_date, cvv = generate_card_details()
         
@@ -272,39 +1059,35 @@ def issue_card():
     else:
         flash('Account not found or you do not have permission to access it.', 'error')
     
-    return redirect(url_for('account_cards', account_id=account_id))
+    return redirect(url_for('bank.account_cards', account_id=account_id))
 
-@app.route('/transfer', methods=['GET', 'POST'])
+@bank.route('/transfer', methods=['GET', 'POST'])
 def transfer_funds():
     if 'user_id' not in session:
         flash('Please log in to transfer funds.', 'info')
-        return redirect(url_for('login'))
+        return redirect(url_for('bank.login'))
 
     user_id = session['user_id']
-    user_accounts = Account.query.filter_by(user_id=user_id).all()
-
-    if not user_accounts or len(user_accounts) < 1: # Need at least one account to transfer from, ideally 2 for internal transfer
-        flash('You need at least one account to transfer funds. Consider opening another account if you wish to transfer internally.', 'warning')
-        return redirect(url_for('dashboard'))
 
     if request.method == 'POST':
+        # Validate the form before touching the database
         try:
             from_account_id = int(request.form['from_account'])
             to_account_number = request.form['to_account_number'] # Target account number (string)
-            amount = float(request.form['amount'])
+            amount = parse_amount(request.form['amount'])
             description = request.form.get('description', 'Fund transfer')
         except ValueError:
             flash('Invalid data provided for transfer.', 'error')
-            return render_template('transfer_funds.html', accounts=user_accounts, error='Invalid input.')
+            return render_template('transfer_funds.html', accounts=get_user_summary(user_id)[1], error='Invalid input.')
 
         if amount <= 0:
             flash('Transfer amount must be positive.', 'error')
-            return render_template('transfer_funds.html', accounts=user_accounts)
+            return render_template('transfer_funds.html', accounts=get_user_summary(user_id)[1])
 
-        from_account = db.session.get(Account, from_account_id)
+        from_account = get_account_summary(user_id, from_account_id)
         # For simplicity, allowing transfer to any account in the system by account number.
         # In a real system, you'd have stricter checks and differentiate between internal and external transfers.
-        to_account = Account.query.filter_by(account_number=to_account_number).first()
+        to_account = find_account_by_number(to_account_number) if from_account else None
 
         if not from_account:
             flash('Invalid source account selected.', 'error')
@@ -312,45 +1095,32 @@ def transfer_funds():
             flash(f'Recipient account {to_account_number} not found.', 'error')
         elif from_account.id == to_account.id:
             flash('Cannot transfer funds to the same account.', 'error')
-        elif from_account.balance < amount:
+        elif not run_in_transaction(lambda: record_transfer(from_account, to_account, amount, description)):
             flash('Insufficient funds in the source account.', 'error')
         else:
-            # Perform the transfer
-            from_account.balance -= amount
-            to_account.balance += amount
-
-            # Record transactions
-            withdrawal_tx = Transaction(
-                account_id=from_account.id,
-                type='transfer_out',
-                amount=amount,
-                description=f'Transfer to {to_account.account_number} - {description}'
-            )
-            deposit_tx = Transaction(
-                account_id=to_account.id,
-                type='transfer_in',
-                amount=amount,
-                description=f'Transfer from {from_account.account_number} - {description}'
-            )
-            db.session.add_all([withdrawal_tx, deposit_tx, from_account, to_account])
-            db.session.commit()
+            invalidate_user_cache(from_account.user_id, to_account.user_id)
             flash(f'Successfully transferred ${amount:.2f} from {from_account.account_number} to {to_account.account_number}.', 'success')
-            return redirect(url_for('dashboard')) 
+            return redirect(url_for('bank.dashboard')) 
         
         # If any error occurred before success, re-render the form
-        return render_template('transfer_funds.html', accounts=user_accounts, 
+        return render_template('transfer_funds.html', accounts=get_user_summary(user_id)[1],
                                from_account_id=from_account_id, 
                                to_account_number=to_account_number, 
                                amount=amount, 
                                description=description) # Pass back form values
 
+    _, user_accounts = get_user_summary(user_id)
+    if not user_accounts: # Need at least one account to transfer from, ideally 2 for internal transfer
+        flash('You need at least one account to transfer funds. Consider opening another account if you wish to transfer internally.', 'warning')
+        return redirect(url_for('bank.dashboard'))
+
     return render_template('transfer_funds.html', accounts=user_accounts)
 
-@app.route('/open_account', methods=['GET', 'POST'])
+@bank.route('/open_account', methods=['GET', 'POST'])
 def open_account():
     if 'user_id' not in session:
         flash('Please log in to open a new account.', 'info')
-        return redirect(url_for('login'))
+        return redirect(url_for('bank.login'))
 
     if request.method == 'POST':
         account_type = request.form.get('account_type')
@@ -360,26 +1130,22 @@ def open_account():
             flash('Please select an account type.', 'error')
             return render_template('open_account.html') # Re-render with error
 
+        existing_same_type_accounts, total_user_accounts = count_user_accounts(user_id, account_type)
         # For simplicity, let's say a user can have max 2 accounts of each type
-        existing_same_type_accounts = Account.query.filter_by(user_id=user_id, account_type=account_type).count()
         if existing_same_type_accounts >= 2:
             flash(f'You already have the maximum number of {account_type} accounts allowed (2).', 'warning')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('bank.dashboard'))
         
         # Basic check: limit total accounts per user (e.g., 5 total)
-        total_user_accounts = Account.query.filter_by(user_id=user_id).count()
         if total_user_accounts >= 5:
             flash('You have reached the maximum total number of accounts allowed (5).', 'warning')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('bank.dashboard'))
 
         new_account_number = generate_account_number()
-        # Ensure the generated account number is unique (highly likely, but good practice for a real system)
-        while Account.query.filter_by(account_number=new_account_number).first() is not None:
-            new_account_number = generate_account_number()
 
-        initial_balance = 0.0 # New accounts start with zero balance
+        initial_balance = Decimal('0.00') # New accounts start with zero balance
         if account_type == "Savings":
-             initial_balance = 50.0 # Small bonus for opening a savings account
+             initial_balance = Decimal('50.00') # Small bonus for opening a savings account
 
         new_acc = Account(
             user_id=user_id,
@@ -388,73 +1154,1477 @@ def open_account():
             balance=initial_balance 
         )
         db.session.add(new_acc)
+        db.session.flush()
+        record_opening_balance(new_acc.id, initial_balance)
         db.session.commit()
+        invalidate_user_cache(user_id)
 
         flash(f'New {account_type} account ({new_account_number}) opened successfully with an initial balance of ${initial_balance:.2f}!', 'success')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('bank.dashboard'))
 
     return render_template('open_account.html')
 
-@app.route('/profile', methods=['GET', 'POST'])
+@bank.route('/profile', methods=['GET', 'POST'])
 def profile():
     if 'user_id' not in session:
         flash('Please log in to view your profile.', 'info')
-        return redirect(url_for('login'))
+        return redirect(url_for('bank.login'))
 
     user = db.session.get(User, session['user_id'])
     if not user:
         flash('User not found. Please log in again.', 'error')
         session.clear()
-        return redirect(url_for('login'))
+        return redirect(url_for('bank.login'))
 
     if request.method == 'POST':
         new_full_name = request.form.get('full_name', '').strip()
         if new_full_name:
             user.full_name = new_full_name
             db.session.commit()
+            invalidate_user_cache(user.id)
             flash('Profile updated successfully!', 'success')
         else:
             flash('Full name cannot be empty.', 'error')
-        return redirect(url_for('profile'))
+        return redirect(url_for('bank.profile'))
 
     return render_template('profile.html', user=user)
 
-# --- Interest Calculation (Simplified Example) ---
+# --- JSON API ---
+# Versioned JSON endpoints for the mobile client, sharing the session cookie and the
+# data helpers of the HTML routes. Responses are compact JSON with money amounts as
+# strings (e.g. "12.50"), so no precision is lost in clients that parse JSON numbers
+# as floats. Balance and history reads carry an ETag; a request with a matching
+# If-None-Match gets an empty 304 instead of the body.
+api = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+API_INCLUDES = ('transactions', 'cards')
+
+def api_response(payload, status=200, conditional=False):
+    response = Response(json.dumps(payload, separators=(',', ':')), status=status, mimetype='application/json')
+    if conditional:
+        response.headers['Cache-Control'] = 'private, no-cache' # Always revalidate, never share
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+def api_error(status, message):
+    return api_response({'error': message}, status=status)
+
+@api.errorhandler(HTTPException)
+def api_http_error(exc):
+    return api_error(exc.code, exc.description)
+
+@api.before_request
+def api_require_login():
+    if request.endpoint != 'api_v1.api_login' and 'user_id' not in session:
+        return api_error(401, 'Authentication required.')
+
+def serialize_account(account):
+    return {'id': account.id, 'number': account.account_number, 'type': account.account_type,
+            'balance': f'{account.balance:.2f}'}
+
+def serialize_transaction(transaction):
+    return {'id': transaction.id, 'timestamp': transaction.timestamp.isoformat(), 'type': transaction.type,
+            'amount': f'{transaction.amount:.2f}', 'description': transaction.description}
+
+def serialize_card(card):
+    return {'id': card.id, 'account_id': card.account_id,
+            'number': f'{card.card_number[:4]} **** **** {card.card_number[-4:]}',
+            'expiry': card.expiry_date, 'active': card.is_active}
+
+def api_page_size():
+    page_size = request.args.get('limit', TRANSACTIONS_PAGE_SIZE, type=int)
+    return max(1, min(page_size, TRANSACTIONS_MAX_PAGE_SIZE))
+
+def api_owned_account(account_id):
+    account = get_account_summary(session['user_id'], account_id)
+    if account is None:
+        abort(404, 'Account not found.')
+    return account
+
+def api_json_body(*fields):
+    """Required fields from the JSON request body; aborts with 400 if any is missing."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or any(data.get(field) in (None, '') for field in fields):
+        abort(400, f"JSON body with {', '.join(fields)} required.")
+    return data
+
+def api_amount(data):
+    try:
+        amount = parse_amount(str(data['amount']))
+    except ValueError:
+        abort(400, 'Invalid amount.')
+    if amount <= 0:
+        abort(400, 'Amount must be positive.')
+    return amount
+
+@api.route('/login', methods=['POST'])
+def api_login():
+    data = api_json_body('username', 'password')
+    user = authenticate(data['username'], data['password'])
+    if not user:
+        return api_error(401, 'Invalid username or password.')
+    session['user_id'] = user.id
+    session['username'] = user.username
+    return api_response({'user': {'id': user.id, 'username': user.username, 'full_name': user.full_name}})
+
+@api.route('/logout', methods=['POST'])
+def api_logout():
+    session.pop('user_id', None)
+    session.pop('username', None)
+    return api_response({})
+
+@api.route('/accounts')
+def api_accounts():
+    """The user's accounts. Batch reads: ?ids=1,2 picks accounts and
+    ?include=transactions,cards adds each account's latest transactions and its cards."""
+    _, user_accounts = get_user_summary(session['user_id'])
+    try:
+        ids = {int(value) for value in request.args['ids'].split(',')} if request.args.get('ids') else None
+    except ValueError:
+        abort(400, 'ids must be a comma-separated list of account ids.')
+    includes = set(filter(None, request.args.get('include', '').split(',')))
+    if includes - set(API_INCLUDES):
+        abort(400, f"include may contain {', '.join(API_INCLUDES)}.")
+
+    selected = [account for account in user_accounts if ids is None or account.id in ids]
+    payload = {'accounts': [serialize_account(account) for account in selected]}
+    if ids is not None:
+        payload['missing'] = sorted(ids - {account.id for account in selected})
+    if 'transactions' in includes:
+        no_filters = parse_history_filters({})
+        page_size = api_page_size()
+        for account, entry in zip(selected, payload['accounts']):
+            transactions, older_cursor, _ = paginate_transactions(account.id, no_filters, page_size)
+            entry['transactions'] = [serialize_transaction(transaction) for transaction in transactions]
+            entry['older'] = older_cursor
+    if 'cards' in includes and selected:
+        by_account = {}
+        for card in Card.query.filter(Card.account_id.in_([account.id for account in selected])).order_by(Card.id):
+            by_account.setdefault(card.account_id, []).append(serialize_card(card))
+        for account, entry in zip(selected, payload['accounts']):
+            entry['cards'] = by_account.get(account.id, [])
+    return api_response(payload, conditional=True)
+
+@api.route('/accounts/<int:account_id>')
+def api_account(account_id):
+    return api_response({'account': serialize_account(api_owned_account(account_id))}, conditional=True)
+
+@api.route('/accounts/<int:account_id>/transactions')
+def api_account_transactions(account_id):
+    """One page of history; same filters and cursors as the HTML history page."""
+    account = api_owned_account(account_id)
+    try:
+        filters = parse_history_filters(request.args)
+        transactions, older_cursor, newer_cursor = paginate_transactions(
+            account.id, filters, api_page_size(),
+            before=request.args.get('before'), after=request.args.get('after'))
+    except ValueError:
+        abort(400, 'Invalid transaction filter or cursor.')
+    return api_response({'transactions': [serialize_transaction(transaction) for transaction in transactions],
+                         'older': older_cursor, 'newer': newer_cursor}, conditional=True)
+
+@api.route('/accounts/<int:account_id>/cards')
+def api_account_cards(account_id):
+    account = get_owned_account(session['user_id'], account_id, db.joinedload(Account.cards))
+    if account is None:
+        abort(404, 'Account not found.')
+    return api_response({'cards': [serialize_card(card) for card in account.cards]})
+
+@api.route('/accounts/<int:account_id>/deposit', methods=['POST'])
+def api_deposit(account_id):
+    account = api_owned_account(account_id)
+    data = api_json_body('amount')
+    amount = api_amount(data)
+    run_in_transaction(lambda: record_deposit(account, amount, data.get('description') or 'User deposit'))
+    invalidate_user_cache(account.user_id)
+    # Return the new balance so the client doesn't need a follow-up read
+    return api_response({'account': serialize_account(api_owned_account(account_id))})
+
+@api.route('/accounts/<int:account_id>/withdraw', methods=['POST'])
+def api_withdraw(account_id):
+    account = api_owned_account(account_id)
+    data = api_json_body('amount')
+    amount = api_amount(data)
+    if not run_in_transaction(lambda: record_withdrawal(account, amount, data.get('description') or 'User withdrawal')):
+        return api_error(409, 'Insufficient funds.')
+    invalidate_user_cache(account.user_id)
+    return api_response({'account': serialize_account(api_owned_account(account_id))})
+
+@api.route('/transfers', methods=['POST'])
+def api_transfer():
+    data = api_json_body('from_account_id', 'to_account_number', 'amount')
+    try:
+        from_account = api_owned_account(int(data['from_account_id']))
+    except (TypeError, ValueError):
+        abort(400, 'Invalid from_account_id.')
+    amount = api_amount(data)
+    description = data.get('description') or 'Fund transfer'
+    to_account = find_account_by_number(str(data['to_account_number']))
+    if not to_account:
+        return api_error(404, 'Recipient account not found.')
+    if from_account.id == to_account.id:
+        return api_error(400, 'Cannot transfer funds to the same account.')
+    if not run_in_transaction(lambda: record_transfer(from_account, to_account, amount, description)):
+        return api_error(409, 'Insufficient funds in the source account.')
+    invalidate_user_cache(from_account.user_id, to_account.user_id)
+    return api_response({'account': serialize_account(api_owned_account(from_account.id))}, status=201)
+
+
+# --- Bulk Transfers ---
+# Payment files (CSV with a header row, or JSON lines) with the fields
+# from_account, to_account_number, amount, description and idempotency_key.
+BULK_TRANSFER_BATCH_SIZE = 500
+
+def read_transfer_file(stream, file_format):
+    """Yield one dict per row of a bulk transfer file opened in binary mode.
+
+    A row that can't be parsed raises ValueError naming its row number.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if file_format == 'csv':
+        rows = csv.DictReader(text)
+    else:
+        rows = (json.loads(line) for line in text if line.strip())
+    row_number = 0
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            return
+        except (ValueError, csv.Error) as exc: # Includes undecodable bytes and bad JSON
+            raise ValueError(f'row {row_number + 1}: {exc}') from exc
+        row_number += 1
+        yield row
+
+def _bulk_row_error(row_number, key, message):
+    return {'row': row_number, 'idempotency_key': key, 'status': 'error', 'error': message}
+
+def process_bulk_transfers(rows, user_id=None, batch_size=BULK_TRANSFER_BATCH_SIZE):
+    """Apply transfers from an iterable of row dicts, yielding one result dict per row.
+
+    Rows are handled in batches: account numbers and idempotency keys for a whole batch
+    are looked up with one query each, and the batch is applied in a single database
+    transaction. A row whose key was already applied (in this or an earlier file) is
+    reported as a duplicate and not applied again. When user_id is given, transfers
+    may only be made from that user's accounts.
+    """
+    rows = iter(rows)
+    row_number = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        numbers = set()
+        keys = set()
+        for row in batch:
+            if isinstance(row, dict):
+                numbers.update(str(row.get(field) or '').strip() for field in ('from_account', 'to_account_number'))
+                keys.add(str(row.get('idempotency_key') or '').strip())
+        accounts = {
+            account.account_number: account for account in db.session.execute(
+                db.select(Account.id, Account.account_number, Account.user_id)
+                .where(Account.account_number.in_(numbers))
+            ).all()
+        }
+        first_row = row_number + 1
+        row_number += len(batch)
+
+        def apply_batch():
+            results = []
+            touched_users = set()
+            transfers = []
+            idempotency_rows = []
+            # Read inside the transaction, so a retry sees keys another submission committed meanwhile
+            seen = {(account_id, key) for account_id, key in db.session.execute(
+                db.select(IdempotentTransfer.from_account_id, IdempotentTransfer.idempotency_key)
+                .where(IdempotentTransfer.idempotency_key.in_(keys),
+                       IdempotentTransfer.from_account_id.in_([account.id for account in accounts.values()]))
+            )}
+            for offset, row in enumerate(batch):
+                number = first_row + offset
+                if not isinstance(row, dict):
+                    results.append(_bulk_row_error(number, None, 'Row is not an object.'))
+                    continue
+                key = str(row.get('idempotency_key') or '').strip()
+                from_account = accounts.get(str(row.get('from_account') or '').strip())
+                to_account = accounts.get(str(row.get('to_account_number') or '').strip())
+                description = str(row.get('description') or 'Bulk transfer')
+                try:
+                    amount = parse_amount(str(row.get('amount', '')))
+                except (ValueError, ArithmeticError):
+                    amount = None # Reported below, like any other unusable amount
+                if not key or len(key) > 100:
+                    results.append(_bulk_row_error(number, key, 'Missing or too long idempotency_key.'))
+                # Ownership comes first, so a row can't probe keys used on someone else's account
+                elif not from_account or (user_id is not None and from_account.user_id != user_id):
+                    results.append(_bulk_row_error(number, key, 'Source account not found.'))
+                elif (from_account.id, key) in seen:
+                    results.append({'row': number, 'idempotency_key': key, 'status': 'duplicate'})
+                elif amount is None or amount <= 0:
+                    results.append(_bulk_row_error(number, key, 'Amount must be positive, with at most two decimal places.'))
+                elif not to_account:
+                    results.append(_bulk_row_error(number, key, 'Recipient account not found.'))
+                elif from_account.id == to_account.id:
+                    results.append(_bulk_row_error(number, key, 'Cannot transfer funds to the same account.'))
+                elif not move_funds(from_account.id, to_account.id, amount):
+                    results.append(_bulk_row_error(number, key, 'Insufficient funds.'))
+                else:
+                    transfers.append((from_account, to_account, amount, description, key))
+                    idempotency_rows.append({'idempotency_key': key, 'from_account_id': from_account.id,
+                                             'to_account_id': to_account.id, 'amount': amount})
+                    seen.add((from_account.id, key))
+                    touched_users.update((from_account.user_id, to_account.user_id))
+                    results.append({'row': number, 'idempotency_key': key, 'status': 'ok'})
+            # Ledger and log rows for the whole batch go in with one executemany each
+            if transfers:
+                entry_ids = post_entries([
+                    {'kind': 'transfer', 'description': description, 'reference': key,
+                     'postings': transfer_postings(from_account, to_account, amount)}
+                    for from_account, to_account, amount, description, key in transfers
+                ])
+                db.session.execute(db.insert(Transaction), [
+                    row for (from_account, to_account, amount, description, _), entry_id in zip(transfers, entry_ids)
+                    for row in transfer_transaction_rows(from_account, to_account, amount, description, entry_id)
+                ])
+                db.session.execute(db.insert(IdempotentTransfer), idempotency_rows)
+            return results, touched_users
+
+        for attempt in range(DB_RETRY_ATTEMPTS):
+            try:
+                results, touched_users = run_in_transaction(apply_batch)
+                break
+            except IntegrityError:
+                # A concurrent submission of the same keys committed first; running the
+                # batch again reports those rows as duplicates
+                db.session.rollback()
+                if attempt == DB_RETRY_ATTEMPTS - 1:
+                    raise
+        invalidate_user_cache(*touched_users)
+        yield from results
+
+@bank.route('/transfer/bulk', methods=['POST'])
+def bulk_transfer():
+    if 'user_id' not in session:
+        flash('Please log in to transfer funds.', 'info')
+        return redirect(url_for('bank.login'))
+
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash('Please choose a CSV or JSON lines file to upload.', 'error')
+        return redirect(url_for('bank.transfer_funds'))
+    file_format = 'csv' if upload.filename.lower().endswith('.csv') else 'jsonl'
+    user_id = session['user_id']
+    # The upload is closed with the request, before the streamed response is consumed
+    stream = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    shutil.copyfileobj(upload.stream, stream)
+    stream.seek(0)
+
+    def generate():
+        try:
+            for result in process_bulk_transfers(read_transfer_file(stream, file_format), user_id=user_id):
+                yield json.dumps(result) + '\n'
+        except ValueError as exc: # Malformed file; earlier batches stay applied
+            yield json.dumps({'status': 'error', 'error': f'Could not read file at {exc}'}) + '\n'
+        finally:
+            stream.close()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@bank.cli.command('bulk-transfer')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=BULK_TRANSFER_BATCH_SIZE, show_default=True)
+def bulk_transfer_command(path, batch_size):
+    """Apply a CSV or JSON lines payment file, printing one JSON result per row."""
+    file_format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+    counts = {}
+    started = time.perf_counter()
+    failure = None
+    with open(path, 'rb') as stream:
+        try:
+            for result in process_bulk_transfers(read_transfer_file(stream, file_format), batch_size=batch_size):
+                counts[result['status']] = counts.get(result['status'], 0) + 1
+                click.echo(json.dumps(result))
+        except ValueError as exc: # Malformed file; the batches reported above stay applied
+            failure = exc
+    seconds = time.perf_counter() - started
+    total = sum(counts.values())
+    summary = ', '.join(f'{count} {status}' for status, count in sorted(counts.items()))
+    click.echo(f'{total} rows in {seconds:.2f}s ({total / seconds if seconds else 0:.0f} rows/sec): {summary}', err=True)
+    if failure:
+        raise click.ClickException(
+            f'Could not read {path} at {failure}. Nothing from row {total + 1} on was applied; '
+            f'rows already applied are reported as duplicate if the corrected file is resubmitted.')
+
+# --- Statement Export ---
+STATEMENT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+STATEMENT_COLUMNS = ('id', 'timestamp', 'type', 'amount', 'description')
+STATEMENT_BATCH_SIZE = 1000
+
+def iter_statement_rows(account_id, filters):
+    """Yield an account's transactions oldest first as plain rows, fetched in batches
+    from a server-side cursor so memory stays flat however long the history is.
+    Archived months come first, each from its archive table, then the hot table."""
+    sources = [archive_table(month).c for month in archived_months(account_id, filters)] + [Transaction]
+    for columns in sources:
+        result = db.session.execute(
+            db.select(*(getattr(columns, name) for name in HISTORY_COLUMNS))
+            .where(*transaction_history_conditions(account_id, filters, columns))
+            .order_by(columns.timestamp.asc(), columns.id.asc())
+            .execution_options(yield_per=STATEMENT_BATCH_SIZE)
+        )
+        for partition in result.partitions():
+            yield from partition
+
+def statement_chunks(rows, file_format):
+    """Render statement rows as CSV or NDJSON text, one chunk per batch of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if file_format == 'csv':
+        writer.writerow(STATEMENT_COLUMNS)
+    for count, (tx_id, timestamp, tx_type, amount, description) in enumerate(rows, start=1):
+        if file_format == 'csv':
+            writer.writerow((tx_id, timestamp.isoformat(), tx_type, f'{amount:.2f}', description or ''))
+        else:
+            buffer.write(json.dumps({'id': tx_id, 'timestamp': timestamp.isoformat(), 'type': tx_type,
+                                     'amount': f'{amount:.2f}', 'description': description}) + '\n')
+        if count % STATEMENT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@bank.route('/account/<int:account_id>/transactions.<file_format>')
+def export_transactions(account_id, file_format):
+    if 'user_id' not in session:
+        flash('Please log in.', 'info')
+        return redirect(url_for('bank.login'))
+    if file_format not in STATEMENT_FORMATS:
+        abort(404)
+
+    account = owned_account_summary_or_404(session['user_id'], account_id)
+    try:
+        filters = parse_history_filters(request.args)
+    except ValueError:
+        abort(400)
+    filename = f'account-{account.account_number}-transactions.{file_format}'
+    body = statement_chunks(iter_statement_rows(account.id, filters), file_format)
+    return Response(stream_with_context(body), mimetype=STATEMENT_FORMATS[file_format],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+_worker_app = None
+
+def _init_worker_process(config):
+    # Each pool process runs its own app, and so its own connection pool, with the parent's settings
+    global _worker_app
+    _worker_app = create_app(config)
+
+def worker_pool(workers):
+    """Process pool for CLI batch work; tasks run under `_worker_app.app_context()`."""
+    from concurrent.futures import ProcessPoolExecutor # Pulls in multiprocessing; only batch commands need it
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker_process,
+                               initargs=(dict(current_app.config),))
+
+def export_account_statements(accounts, out_dir, filters, file_format):
+    """Write one statement file per (account_id, account_number); returns the file count."""
+    with _worker_app.app_context():
+        for account_id, account_number in accounts:
+            path = os.path.join(out_dir, f'{account_number}.{file_format}')
+            with open(path, 'w', newline='', encoding='utf-8') as out:
+                for chunk in statement_chunks(iter_statement_rows(account_id, filters), file_format):
+                    out.write(chunk)
+    return len(accounts)
+
+@bank.cli.command('export-statements')
+@click.argument('out_dir', type=click.Path(file_okay=False))
+@click.option('--start', help='First day to include, YYYY-MM-DD.')
+@click.option('--end', help='Last day to include, YYYY-MM-DD.')
+@click.option('--type', 'tx_type', help='Only include this transaction type.')
+@click.option('--format', 'file_format', type=click.Choice(sorted(STATEMENT_FORMATS)), default='csv', show_default=True)
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True, help='Parallel export processes.')
+@click.option('--batch', default=200, show_default=True, help='Accounts per work unit.')
+def export_statements_command(out_dir, start, end, tx_type, file_format, workers, batch):
+    """Export a statement file for every account, in parallel."""
+    try:
+        filters = parse_history_filters({'start': start, 'end': end, 'type': tx_type})
+    except ValueError as exc:
+        raise click.BadParameter(str(exc))
+    os.makedirs(out_dir, exist_ok=True)
+    accounts = [tuple(row) for row in db.session.execute(
+        db.select(Account.id, Account.account_number).order_by(Account.id)).all()]
+    db.session.remove()
+    work = [accounts[index:index + batch] for index in range(0, len(accounts), batch)]
+    started = time.perf_counter()
+    with worker_pool(workers) as executor:
+        exported = sum(executor.map(export_account_statements, work, repeat(out_dir), repeat(filters), repeat(file_format)))
+    click.echo(f'Exported {exported} statements to {out_dir} in {time.perf_counter() - started:.2f}s.')
+
+# --- Interest Calculation ---
 # This would typically be a scheduled task
-def apply_interest():
-    with app.app_context(): # Ensure we are in application context
-        accounts = Account.query.filter(Account.account_type == 'Savings').all()
-        interest_rate = 0.01 # 1% annual interest, applied monthly for simplicity
-        
-        for account in accounts:
-            interest_earned = account.balance * (interest_rate / 12) # Monthly interest
+INTEREST_RATE = Decimal('0.01') # 1% annual interest, applied monthly for simplicity
+INTEREST_CHUNK_SIZE = 1000
+
+
+def apply_interest(period=None, chunk_size=INTEREST_CHUNK_SIZE, dry_run=False, pause=0.0):
+    """Credit one month of interest to every Savings account with a positive balance.
+
+    Accounts are walked in chunks keyed by Account.id, so memory stays bounded and each
+    chunk is its own short database transaction. Progress is checkpointed in an
+    InterestRun row for the period (YYYY-MM), which makes an interrupted run resumable
+    and a completed one a no-op. With dry_run=True nothing is written and the returned
+    totals describe what a real run would credit. `pause` sleeps between chunks to
+    leave the database to live traffic.
+
+    Each chunk first advances the checkpoint with a conditional UPDATE. If another run
+    of the same period has moved it since, the chunk is rolled back and this run stops,
+    so overlapping runs never credit an account twice. Callers should still hold the
+    apply_interest job lock, as the scheduler and the apply-interest command do.
+    """
+    period = period or utc_today().strftime('%Y-%m')
+    run = InterestRun.query.filter_by(period=period).first()
+    if run is None and not dry_run:
+        db.session.add(InterestRun(period=period))
+        try:
+            db.session.commit()
+        except IntegrityError: # Another run created it first
+            db.session.rollback()
+        run = InterestRun.query.filter_by(period=period).first()
+    if run and run.finished_at:
+        current_app.logger.info('Interest for %s was already applied.', period)
+        return {'period': period, 'accounts': 0, 'interest': Decimal('0.00'), 'seconds': 0.0, 'accounts_per_sec': 0.0,
+                'already_applied': True, 'stopped': False}
+
+    last_account_id = checkpoint = run.last_account_id if run else 0
+    monthly_rate = INTEREST_RATE / 12
+    processed = 0
+    stopped = False
+    total_interest = Decimal('0.00')
+    started = time.perf_counter()
+
+    while True:
+        chunk = db.session.execute(
+            db.select(Account.id, Account.balance, Account.user_id)
+            .where(Account.account_type == 'Savings', Account.id > last_account_id, Account.balance > 0)
+            .order_by(Account.id)
+            .limit(chunk_size)
+        ).all()
+        if not chunk:
+            break
+        last_account_id = chunk[-1].id
+
+        credits = []
+        for account_id, balance, _ in chunk:
+            interest_earned = (balance * monthly_rate).quantize(CENT, rounding=ROUND_HALF_EVEN)
             if interest_earned > 0:
-                account.balance += interest_earned
-                new_transaction = Transaction(
-                    account_id=account.id,
-                    type='interest',
-                    amount=interest_earned,
-                    description='Monthly interest accrued'
-                )
-                db.session.add(new_transaction)
+                credits.append({'b_account_id': account_id, 'b_amount': interest_earned})
+        chunk_interest = sum(credit['b_amount'] for credit in credits)
+
+        if dry_run:
+            processed += len(credits)
+            total_interest += chunk_interest
+            continue
+        # The checkpoint moves in the same transaction as the chunk, so a resumed run
+        # never double-credits; it only moves from where this run last left it
+        advanced = db.session.execute(
+            db.update(InterestRun)
+            .where(InterestRun.id == run.id, InterestRun.last_account_id == checkpoint)
+            .values(last_account_id=last_account_id,
+                    accounts_processed=InterestRun.accounts_processed + len(credits),
+                    total_interest=InterestRun.total_interest + chunk_interest)
+        ).rowcount
+        if not advanced:
+            db.session.rollback()
+            current_app.logger.warning('Interest run for %s stopped: another run advanced its checkpoint', period)
+            stopped = True
+            break
+        if credits:
+            db.session.execute(_credit_statement, credits)
+            entry_ids = post_entries([
+                {'kind': 'interest', 'description': 'Monthly interest accrued', 'reference': period,
+                 'postings': [(credit['b_account_id'], None, credit['b_amount']),
+                              (None, LEDGER_INTEREST, -credit['b_amount'])]}
+                for credit in credits
+            ])
+            db.session.execute(db.insert(Transaction), [
+                {'account_id': credit['b_account_id'], 'type': 'interest', 'amount': credit['b_amount'],
+                 'description': 'Monthly interest accrued', 'entry_id': entry_id}
+                for credit, entry_id in zip(credits, entry_ids)
+            ])
+        db.session.commit()
+        checkpoint = last_account_id
+        processed += len(credits)
+        total_interest += chunk_interest
+        invalidate_user_cache(*(user_id for _, _, user_id in chunk))
+        if pause:
+            time.sleep(pause)
+
+    if not dry_run and not stopped:
+        db.session.execute(db.update(InterestRun).where(InterestRun.id == run.id).values(finished_at=utcnow()))
+        db.session.commit()
+
+    seconds = time.perf_counter() - started
+    rate = processed / seconds if seconds else 0.0
+    mode = 'Would apply' if dry_run else 'Applied'
+    current_app.logger.info('%s %s interest of $%s to %s savings accounts in %.2fs (%.0f accounts/sec).',
+                            mode, period, total_interest, processed, seconds, rate)
+    return {'period': period, 'accounts': processed, 'interest': total_interest,
+            'seconds': seconds, 'accounts_per_sec': rate, 'already_applied': False, 'stopped': stopped}
+
+@bank.cli.command('apply-interest')
+@click.option('--period', help='Month to accrue, as YYYY-MM (defaults to the current month).')
+@click.option('--chunk-size', default=INTEREST_CHUNK_SIZE, show_default=True, help='Accounts per database transaction.')
+@click.option('--dry-run', is_flag=True, help='Compute totals without writing anything.')
+def apply_interest_command(period, chunk_size, dry_run):
+    """Credit monthly interest to savings accounts."""
+    if dry_run:
+        stats = apply_interest(period=period, chunk_size=chunk_size, dry_run=True)
+    else:
+        # The scheduled apply_interest job takes the same lock
+        owner = _job_lock_owner()
+        if not acquire_job_lock('apply_interest', owner, current_app.config['JOB_LOCK_TTL_SECONDS']):
+            raise click.ClickException('apply_interest is already running elsewhere.')
+        try:
+            stats = apply_interest(period=period, chunk_size=chunk_size)
+        finally:
+            release_job_lock('apply_interest', owner)
+    if stats['already_applied']:
+        click.echo(f"Interest for {stats['period']} was already applied.")
+        return
+    mode = 'Would apply' if dry_run else 'Applied'
+    click.echo(f"{mode} {stats['period']} interest of ${stats['interest']:.2f} to {stats['accounts']} savings accounts "
+               f"in {stats['seconds']:.2f}s ({stats['accounts_per_sec']:.0f} accounts/sec).")
+    if stats['stopped']:
+        raise click.ClickException('Stopped early: another run of this period moved its checkpoint.')
+
+
+# --- Balance Snapshots ---
+CREDIT_TYPES = ('deposit', 'interest', 'transfer_in')
+
+def signed_amount(columns=Transaction):
+    """SQL expression for a transaction's effect on its account balance."""
+    return db.case((columns.type.in_(CREDIT_TYPES), columns.amount), else_=-columns.amount)
+
+def _day_start(day):
+    return datetime.datetime.combine(day, datetime.time.min)
+
+def account_opened_before(moment):
+    """SQL condition: the account existed before `moment`.
+
+    Accounts have no opening time of their own, so this is taken from the first
+    posting or transaction on the account. Balances posted by backfill_ledger predate
+    the ledger itself and count as opened at any time.
+    """
+    posting, other_side = db.aliased(Posting), db.aliased(Posting)
+    predates_ledger = db.select(other_side.id).where(
+        other_side.entry_id == posting.entry_id, other_side.ledger_code == LEDGER_OPENING).exists()
+    return db.or_(
+        db.select(posting.id).where(
+            posting.account_id == Account.id, db.or_(posting.created_at < moment, predates_ledger)).exists(),
+        db.select(Transaction.id).where(Transaction.account_id == Account.id, Transaction.timestamp < moment).exists(),
+    )
+
+def snapshot_balances(day=None):
+    """Record the end-of-day balance for `day` (default: yesterday) of every account
+    opened by then.
+
+    The snapshot is derived from the live balance minus the transactions posted after
+    that day, in one INSERT ... SELECT, so it can run at any time after midnight.
+    Re-running a day replaces its snapshots.
+    """
+    day = day or utc_today() - datetime.timedelta(days=1)
+    end = _day_start(day + datetime.timedelta(days=1))
+    later = db.select(db.func.coalesce(db.func.sum(signed_amount()), 0)).where(
+        Transaction.account_id == Account.id,
+        Transaction.timestamp >= end,
+    ).scalar_subquery()
+    db.session.execute(db.delete(BalanceSnapshot).where(BalanceSnapshot.day == day))
+    db.session.execute(db.insert(BalanceSnapshot).from_select(
+        ['account_id', 'day', 'balance'],
+        # Opening balances have no transaction to subtract, so accounts opened later
+        # would be recorded with them
+        db.select(Account.id, db.literal(day, db.Date), Account.balance - later).where(account_opened_before(end)),
+    ))
+    db.session.commit()
+    return BalanceSnapshot.query.filter_by(day=day).count()
+
+def balance_as_of(account_id, moment):
+    """Balance of an account at `moment`, from the nearest earlier snapshot plus the
+    transactions since; falls back to the live balance when no snapshot exists."""
+    snapshot = BalanceSnapshot.query.filter(
+        BalanceSnapshot.account_id == account_id, BalanceSnapshot.day < moment.date()
+    ).order_by(BalanceSnapshot.day.desc()).first()
+    if snapshot:
+        since = _day_start(snapshot.day + datetime.timedelta(days=1))
+        return snapshot.balance + account_movement(account_id, since, moment)
+    return db.session.get(Account, account_id).balance - account_movement(account_id, moment)
+
+def reconcile_balances(day):
+    """Check that each snapshot for `day` equals the previous day's snapshot plus that
+    day's transactions. Returns a list of (account_id, expected, actual) mismatches."""
+    previous = db.aliased(BalanceSnapshot)
+    movement = db.select(db.func.coalesce(db.func.sum(signed_amount()), 0)).where(
+        Transaction.account_id == BalanceSnapshot.account_id,
+        Transaction.timestamp >= _day_start(day),
+        Transaction.timestamp < _day_start(day + datetime.timedelta(days=1)),
+    ).scalar_subquery()
+    expected = previous.balance + movement
+    rows = db.session.execute(
+        db.select(BalanceSnapshot.account_id, expected, BalanceSnapshot.balance)
+        .join(previous, db.and_(previous.account_id == BalanceSnapshot.account_id,
+                                previous.day == day - datetime.timedelta(days=1)))
+        .where(BalanceSnapshot.day == day, BalanceSnapshot.balance != expected)
+    ).all()
+    return [tuple(row) for row in rows]
+
+@bank.cli.command('snapshot-balances')
+@click.option('--day', type=click.DateTime(formats=['%Y-%m-%d']), help='Day to snapshot (defaults to yesterday).')
+def snapshot_balances_command(day):
+    """Record end-of-day balances for every account."""
+    day = day.date() if day else None
+    count = snapshot_balances(day)
+    click.echo(f'Recorded {count} balance snapshots.')
+
+@bank.cli.command('reconcile')
+@click.argument('day', type=click.DateTime(formats=['%Y-%m-%d']))
+def reconcile_command(day):
+    """Compare a day's snapshots with the previous day's plus that day's transactions."""
+    mismatches = reconcile_balances(day.date())
+    for account_id, expected, actual in mismatches:
+        click.echo(f'Account {account_id}: expected ${expected:.2f}, snapshot has ${actual:.2f}')
+    click.echo(f'{len(mismatches)} mismatches.')
+
+# --- Transaction Archive ---
+# Transactions older than ARCHIVE_AFTER_DAYS move out of the hot `transaction` table,
+# a whole calendar month at a time, into one transaction_archive_YYYYMM table per
+# month. That keeps the hot table and its indexes small enough to stay in cache.
+# A MonthlyRollup row per account and month records which archive tables hold the
+# account's rows and what they add up to, so history pages, statements and balances
+# only open an archive table when they actually need rows from that month.
+ARCHIVE_CHUNK_SIZE = 5000
+_archive_metadata = db.MetaData() # Archive tables are created by archive_month, not create_all
+_archive_lock = threading.Lock()
+
+def _month_start(month):
+    return datetime.datetime.strptime(month, '%Y-%m')
+
+def _next_month(month):
+    start = _month_start(month)
+    return f'{start.year + start.month // 12:04d}-{start.month % 12 + 1:02d}'
+
+def archive_table(month):
+    """The archive table for a month ('YYYY-MM'), with the transaction table's columns."""
+    name = f"transaction_archive_{month.replace('-', '')}"
+    with _archive_lock:
+        table = _archive_metadata.tables.get(name)
+        if table is None:
+            table = db.Table(
+                name, _archive_metadata,
+                db.Column('id', db.Integer, primary_key=True, autoincrement=False),
+                db.Column('account_id', db.Integer, nullable=False),
+                db.Column('type', db.String(50), nullable=False),
+                db.Column('amount', Money, nullable=False),
+                db.Column('timestamp', db.DateTime),
+                db.Column('description', db.String(200)),
+                db.Column('entry_id', db.Integer),
+                db.Index(f'ix_{name}_account_timestamp_id', 'account_id', 'timestamp', 'id'),
+            )
+    return table
+
+def archived_months(account_id, filters=None):
+    """Months ('YYYY-MM', oldest first) in which an account has archived transactions,
+    limited to the start/end dates of `filters` if given."""
+    query = db.select(MonthlyRollup.month).where(MonthlyRollup.account_id == account_id)
+    if filters and filters['start']:
+        query = query.where(MonthlyRollup.month >= filters['start'].strftime('%Y-%m'))
+    if filters and filters['end']:
+        query = query.where(MonthlyRollup.month <= filters['end'].strftime('%Y-%m'))
+    return db.session.execute(query.order_by(MonthlyRollup.month)).scalars().all()
+
+def account_movement(account_id, since, until=None):
+    """Net effect on an account's balance of its transactions in [since, until).
+
+    Archived months that lie wholly inside the range are taken from their rollups;
+    only a month the range cuts through is summed from its archive table.
+    """
+    hot = db.select(db.func.coalesce(db.func.sum(signed_amount()), 0)).where(
+        Transaction.account_id == account_id, Transaction.timestamp >= since)
+    if until:
+        hot = hot.where(Transaction.timestamp < until)
+    total = db.session.execute(hot).scalar()
+    rollups = MonthlyRollup.query.filter(
+        MonthlyRollup.account_id == account_id, MonthlyRollup.month >= since.strftime('%Y-%m'))
+    if until:
+        rollups = rollups.filter(MonthlyRollup.month <= until.strftime('%Y-%m'))
+    for rollup in rollups:
+        start, end = _month_start(rollup.month), _month_start(_next_month(rollup.month))
+        if start >= since and (until is None or end <= until):
+            total += rollup.credits - rollup.debits
+            continue
+        table = archive_table(rollup.month)
+        partial = db.select(db.func.coalesce(db.func.sum(signed_amount(table.c)), 0)).where(
+            table.c.account_id == account_id, table.c.timestamp >= since)
+        if until:
+            partial = partial.where(table.c.timestamp < until)
+        total += db.session.execute(partial).scalar()
+    return total
+
+def archive_cutoff(today=None):
+    """Start of the oldest month that stays in the hot table."""
+    horizon = (today or utc_today()) - datetime.timedelta(days=current_app.config['ARCHIVE_AFTER_DAYS'])
+    return datetime.datetime(horizon.year, horizon.month, 1)
+
+def archive_month(month, chunk_size=ARCHIVE_CHUNK_SIZE, pause=0.0):
+    """Move one month of transactions into its archive table; returns the rows moved.
+
+    Rows not yet in the archive table are copied in chunks by id, each chunk its own
+    short database transaction, while they are still read from the hot table. A
+    final transaction copies any stragglers, rebuilds the month's rollups and deletes
+    the hot rows that made it into the archive, so readers switch over to the archive
+    all at once and never see a row twice or not at all. Archiving a month again
+    (e.g. after rows were loaded with old timestamps) adds the new rows to it,
+    whatever their ids.
+    """
+    table = archive_table(month)
+    table.create(db.engine, checkfirst=True)
+    start, end = _month_start(month), _month_start(_next_month(month))
+    columns = [column.name for column in table.columns]
+    in_month = (Transaction.timestamp >= start, Transaction.timestamp < end)
+
+    def copy_chunk(limit=None):
+        rows = (db.select(*(Transaction.__table__.c[name] for name in columns))
+                .where(*in_month, ~db.exists().where(table.c.id == Transaction.id))
+                .order_by(Transaction.id))
+        if limit:
+            rows = rows.limit(limit)
+        return db.session.execute(db.insert(table).from_select(columns, rows)).rowcount
+
+    while copy_chunk(chunk_size):
+        db.session.commit()
+        if pause:
+            time.sleep(pause)
+
+    copy_chunk()
+    db.session.execute(db.delete(MonthlyRollup).where(MonthlyRollup.month == month))
+    is_credit = table.c.type.in_(CREDIT_TYPES)
+    db.session.execute(db.insert(MonthlyRollup).from_select(
+        ['account_id', 'month', 'transaction_count', 'credits', 'debits'],
+        db.select(table.c.account_id, db.literal(month), db.func.count(),
+                  db.func.sum(db.case((is_credit, table.c.amount), else_=0)),
+                  db.func.sum(db.case((is_credit, 0), else_=table.c.amount)))
+        .group_by(table.c.account_id)
+    ))
+    moved = db.session.execute(
+        db.delete(Transaction).where(*in_month, Transaction.id.in_(db.select(table.c.id)))).rowcount
+    registry = db.session.get(ArchiveMonth, month) or ArchiveMonth(month=month, table_name=table.name)
+    registry.row_count = db.session.execute(db.select(db.func.count()).select_from(table)).scalar()
+    registry.archived_at = utcnow()
+    db.session.add(registry)
+    db.session.commit()
+    return moved
+
+def archive_transactions(before=None, chunk_size=ARCHIVE_CHUNK_SIZE, pause=0.0):
+    """Archive every month that starts before `before` (default: archive_cutoff()).
+
+    Returns a list of (month, rows moved) for the months that had any hot rows.
+    """
+    before = before or archive_cutoff()
+    oldest = db.session.execute(db.select(db.func.min(Transaction.timestamp))).scalar()
+    archived = []
+    month = oldest.strftime('%Y-%m') if oldest else None
+    while month and _month_start(month) < before:
+        moved = archive_month(month, chunk_size, pause)
+        if moved:
+            archived.append((month, moved))
+            current_app.logger.info('Archived %s transactions from %s', moved, month)
+        month = _next_month(month)
+    return archived
+
+def drop_archive_tables():
+    """Drop every archive table listed in archive_month, e.g. before recreating the schema."""
+    if not db.inspect(db.engine).has_table(ArchiveMonth.__tablename__):
+        return
+    for month in db.session.execute(db.select(ArchiveMonth.month)).scalars().all():
+        archive_table(month).drop(db.engine, checkfirst=True)
+    db.session.commit()
+
+@bank.cli.command('archive-transactions')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m']),
+              help='Archive months before this one, YYYY-MM (defaults to ARCHIVE_AFTER_DAYS ago).')
+@click.option('--chunk-size', default=ARCHIVE_CHUNK_SIZE, show_default=True, help='Rows copied per database transaction.')
+def archive_transactions_command(before, chunk_size):
+    """Move old transactions out of the hot table into per-month archive tables."""
+    started = time.perf_counter()
+    archived = archive_transactions(before, chunk_size)
+    for month, moved in archived:
+        click.echo(f'{month}: {moved} transactions')
+    total = sum(moved for _, moved in archived)
+    click.echo(f'Archived {total} transactions from {len(archived)} months in {time.perf_counter() - started:.2f}s.')
+
+# --- Ledger Rebuild ---
+LEDGER_RANGE_SIZE = 10000 # Accounts per unit of rebuild work
+LEDGER_BACKFILL_CHUNK_SIZE = 1000
+
+def backfill_ledger(chunk_size=LEDGER_BACKFILL_CHUNK_SIZE, commit=True):
+    """Post an opening entry for every account with a balance but no postings yet.
+
+    Used once when the ledger is introduced (and for data loaded outside the app), so
+    the ledger accounts for balances that predate it. Returns the number of accounts.
+    Each chunk is committed unless `commit` is false, which leaves everything to the
+    caller's transaction.
+    """
+    last_account_id = 0
+    backfilled = 0
+    has_postings = db.select(Posting.id).where(Posting.account_id == Account.id).exists()
+    while True:
+        chunk = db.session.execute(
+            db.select(Account.id, Account.balance)
+            .where(Account.id > last_account_id, Account.balance != 0, ~has_postings)
+            .order_by(Account.id).limit(chunk_size)
+        ).all()
+        if not chunk:
+            return backfilled
+        last_account_id = chunk[-1].id
+        post_entries([
+            {'kind': 'opening', 'description': 'Balance before the ledger was introduced',
+             'postings': [(account_id, None, balance), (None, LEDGER_OPENING, -balance)]}
+            for account_id, balance in chunk
+        ])
+        if commit:
+            db.session.commit()
+        backfilled += len(chunk)
+
+def ledger_discrepancies(first_account_id, last_account_id):
+    """Accounts in the id range whose stored balance differs from the sum of their postings.
+
+    One grouped query per range, read from the posting index; returns a list of
+    (account_id, stored balance, ledger balance).
+    """
+    ledger = (db.select(Posting.account_id, db.func.sum(Posting.amount).label('total'))
+              .where(Posting.account_id.between(first_account_id, last_account_id))
+              .group_by(Posting.account_id).subquery())
+    rows = db.session.execute(
+        db.select(Account.id, Account.balance, ledger.c.total)
+        .outerjoin(ledger, ledger.c.account_id == Account.id)
+        .where(Account.id.between(first_account_id, last_account_id),
+               Account.balance != db.func.coalesce(ledger.c.total, 0))
+        .order_by(Account.id)
+    ).all()
+    return [(account_id, balance, total if total is not None else Decimal('0.00')) for account_id, balance, total in rows]
+
+def _ledger_range_worker(bounds):
+    with _worker_app.app_context():
+        return ledger_discrepancies(*bounds)
+
+def unbalanced_entries(limit=100):
+    """Ids of journal entries whose postings don't sum to zero (there should be none)."""
+    return db.session.execute(
+        db.select(Posting.entry_id).group_by(Posting.entry_id)
+        .having(db.func.sum(Posting.amount) != 0).order_by(Posting.entry_id).limit(limit)
+    ).scalars().all()
+
+def check_ledger(workers=1, range_size=LEDGER_RANGE_SIZE):
+    """Compare every balance with the ledger, splitting accounts into id ranges.
+
+    With workers > 1 the ranges are checked in parallel processes. Returns a dict with
+    the number of accounts checked, the discrepancies and any unbalanced entries.
+    """
+    started = time.perf_counter()
+    first_id, last_id, accounts = db.session.execute(
+        db.select(db.func.min(Account.id), db.func.max(Account.id), db.func.count(Account.id))).one()
+    ranges = [(start, min(start + range_size - 1, last_id))
+              for start in range(first_id or 0, (last_id or -1) + 1, range_size)]
+    if workers > 1 and len(ranges) > 1:
+        db.session.remove()
+        with worker_pool(workers) as executor:
+            results = list(executor.map(_ledger_range_worker, ranges))
+    else:
+        results = [ledger_discrepancies(*bounds) for bounds in ranges]
+    seconds = time.perf_counter() - started
+    return {
+        'accounts': accounts,
+        'discrepancies': [row for result in results for row in result],
+        'unbalanced_entries': unbalanced_entries(),
+        'seconds': seconds,
+        'accounts_per_sec': accounts / seconds if seconds else 0.0,
+    }
+
+def repair_balances(account_ids):
+    """Set these accounts' balances to the sum of their postings."""
+    ledger_total = (db.select(db.func.coalesce(db.func.sum(Posting.amount), 0))
+                    .where(Posting.account_id == Account.id).scalar_subquery())
+    db.session.execute(db.update(Account).where(Account.id.in_(account_ids)).values(balance=ledger_total))
+    user_ids = db.session.execute(db.select(Account.user_id).where(Account.id.in_(account_ids))).scalars().all()
+    db.session.commit()
+    invalidate_user_cache(*user_ids)
+
+@bank.cli.command('ledger-rebuild')
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True, help='Parallel processes, one account range each.')
+@click.option('--range-size', default=LEDGER_RANGE_SIZE, show_default=True, help='Accounts per range.')
+@click.option('--fix', is_flag=True, help='Overwrite mismatched balances with the ledger value.')
+@click.option('--backfill', is_flag=True, help='First post opening entries for accounts that have none.')
+def ledger_rebuild_command(workers, range_size, fix, backfill):
+    """Recompute every balance from the ledger and report accounts that disagree."""
+    if backfill:
+        click.echo(f'Posted opening entries for {backfill_ledger()} accounts.')
+    report = check_ledger(workers=workers, range_size=range_size)
+    for account_id, balance, ledger_balance in report['discrepancies']:
+        click.echo(f'Account {account_id}: balance ${balance:.2f}, ledger ${ledger_balance:.2f}')
+    for entry_id in report['unbalanced_entries']:
+        click.echo(f'Journal entry {entry_id} does not balance.')
+    click.echo(f"Checked {report['accounts']} accounts in {report['seconds']:.2f}s "
+               f"({report['accounts_per_sec']:.0f} accounts/sec): {len(report['discrepancies'])} discrepancies, "
+               f"{len(report['unbalanced_entries'])} unbalanced entries.")
+    if fix and report['discrepancies']:
+        repair_balances([account_id for account_id, _, _ in report['discrepancies']])
+        click.echo(f"Reset {len(report['discrepancies'])} balances to their ledger value.")
+    elif report['discrepancies'] or report['unbalanced_entries']:
+        raise click.exceptions.Exit(1)
+
+# --- Card Reissue ---
+CARD_REISSUE_CHUNK_SIZE = 1000
+
+def reissue_cards(account_type=None, chunk_size=CARD_REISSUE_CHUNK_SIZE):
+    """Replace every active card (optionally only on one account type) with a new one.
+
+    Card numbers for a whole chunk come from one bulk allocation, and each chunk
+    deactivates the old cards and inserts their replacements in a single transaction.
+    Only cards that existed when the run started are reissued.
+    """
+    last_card_id = 0
+    max_card_id = db.session.execute(db.select(db.func.max(Card.id))).scalar() or 0
+    reissued = 0
+    while True:
+        query = (db.select(Card.id, Card.account_id)
+                 .where(Card.is_active.is_(True), Card.id > last_card_id, Card.id <= max_card_id)
+                 .order_by(Card.id).limit(chunk_size))
+        if account_type:
+            query = query.join(Account, Card.account_id == Account.id).where(Account.account_type == account_type)
+        chunk = db.session.execute(query).all()
+        if not chunk:
+            break
+        last_card_id = chunk[-1].id
+        numbers = allocate_card_numbers(len(chunk))
+        db.session.execute(db.update(Card).where(Card.id.in_([card_id for card_id, _ in chunk])).values(is_active=False))
+        db.session.execute(db.insert(Card), [
+            {'account_id': account_id, 'card_number': number, 'expiry_date': generate_card_expiry(),
+             'cvv': generate_cvv(), 'is_active': True}
+            for (_, account_id), number in zip(chunk, numbers)
+        ])
+        db.session.commit()
+        reissued += len(chunk)
+    return reissued
+
+@bank.cli.command('reissue-cards')
+@click.option('--account-type', help='Only reissue cards on accounts of this type, e.g. Checking.')
+@click.option('--chunk-size', default=CARD_REISSUE_CHUNK_SIZE, show_default=True, help='Cards per database transaction.')
+def reissue_cards_command(account_type, chunk_size):
+    """Deactivate active cards and issue replacements with new numbers."""
+    started = time.perf_counter()
+    count = reissue_cards(account_type=account_type, chunk_size=chunk_size)
+    click.echo(f'Reissued {count} cards in {time.perf_counter() - started:.2f}s.')
+
+# --- Background Jobs ---
+# Periodic jobs run off the request path, either in a scheduler thread inside each
+# web worker (BANK_SCHEDULER_ENABLED=true) or in a dedicated `flask jobs worker` process.
+# A row in job_lock makes sure only one process runs a given job at a time.
+JOBS = {}
+
+def register_job(name, interval_seconds):
+    """Register a function as a periodic job that runs every `interval_seconds`."""
+    def decorator(func):
+        JOBS[name] = {'func': func, 'interval': datetime.timedelta(seconds=interval_seconds)}
+        return func
+    return decorator
+
+def _job_lock_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+def acquire_job_lock(name, owner, ttl_seconds):
+    """Take the named job lock if it is free or expired. Returns True on success."""
+    now = utcnow()
+    expires_at = now + datetime.timedelta(seconds=ttl_seconds)
+    taken = db.session.execute(
+        db.update(JobLock)
+        .where(JobLock.name == name, db.or_(JobLock.expires_at < now, JobLock.owner == owner))
+        .values(owner=owner, expires_at=expires_at)
+    ).rowcount
+    if not taken:
+        db.session.add(JobLock(name=name, owner=owner, expires_at=expires_at))
+        try:
+            db.session.flush()
+        except IntegrityError: # Another process holds an unexpired lock
+            db.session.rollback()
+            return False
+    db.session.commit()
+    return True
+
+def release_job_lock(name, owner):
+    db.session.execute(db.delete(JobLock).where(JobLock.name == name, JobLock.owner == owner))
+    db.session.commit()
+
+def job_is_due(name):
+    last_success = db.session.execute(
+        db.select(db.func.max(JobRun.started_at)).where(JobRun.job_name == name, JobRun.status == 'succeeded')
+    ).scalar()
+    return last_success is None or last_success + JOBS[name]['interval'] <= utcnow()
+
+def run_job(app, name, if_due=False):
+    """Run a registered job in `app` under its lock and record the outcome in job_run.
+
+    Returns the JobRun id, or None if another process is already running the job.
+    With `if_due`, also returns None if the job is no longer due once the lock is
+    held, e.g. because another process ran it since the caller checked.
+    """
+    with app.app_context():
+        owner = _job_lock_owner()
+        if not acquire_job_lock(name, owner, current_app.config['JOB_LOCK_TTL_SECONDS']):
+            return None
+        if if_due and not job_is_due(name):
+            release_job_lock(name, owner)
+            return None
+        job_run = JobRun(job_name=name, started_at=utcnow())
+        db.session.add(job_run)
+        db.session.commit()
+        started = time.perf_counter()
+        try:
+            result = JOBS[name]['func']()
+        except Exception as exc:
+            db.session.rollback()
+            current_app.logger.exception('Job %s failed', name)
+            job_run.status, job_run.detail = 'failed', repr(exc)[:500]
+        else:
+            job_run.status = 'succeeded'
+            job_run.detail = str(result)[:500] if result is not None else None
+        job_run.finished_at = utcnow()
+        job_run.duration_ms = int((time.perf_counter() - started) * 1000)
+        db.session.commit()
+        release_job_lock(name, owner)
+        return job_run.id
+
+class JobScheduler:
+    """Polls for due jobs and runs them on a small thread pool."""
+
+    def __init__(self, app, poll_seconds, max_workers):
+        self.app = app
+        self.poll_seconds = poll_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bank-job')
+        self.running = {}
+        self.stopped = threading.Event()
+
+    def tick(self):
+        with self.app.app_context():
+            due = [name for name in JOBS if name not in self.running and job_is_due(name)]
+        for name in due:
+            future = self.executor.submit(run_job, self.app, name, if_due=True)
+            self.running[name] = future
+            future.add_done_callback(lambda _, name=name: self.running.pop(name, None))
+
+    def run_forever(self):
+        while not self.stopped.is_set():
+            try:
+                self.tick()
+            except Exception:
+                self.app.logger.exception('Job scheduler tick failed')
+            self.stopped.wait(self.poll_seconds)
+
+    def stop(self):
+        self.stopped.set()
+        self.executor.shutdown(wait=True)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def start_scheduler(app):
+    """Start the in-process scheduler thread once per process."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler(app, app.config['SCHEDULER_POLL_SECONDS'], app.config['SCHEDULER_WORKERS'])
+            threading.Thread(target=_scheduler.run_forever, name='bank-scheduler', daemon=True).start()
+    return _scheduler
+
+@bank.before_app_request
+def _ensure_scheduler():
+    # Started lazily so each (post-fork) web worker gets its own thread
+    if _scheduler is None and current_app.config['SCHEDULER_ENABLED']:
+        start_scheduler(current_app._get_current_object())
+
+@register_job('apply_interest', interval_seconds=24 * 60 * 60)
+def interest_job():
+    # Runs daily; apply_interest is a no-op once the current month has been credited
+    return apply_interest(pause=current_app.config['JOB_THROTTLE_SECONDS'])
+
+@register_job('snapshot_balances', interval_seconds=24 * 60 * 60)
+def snapshot_job():
+    return snapshot_balances()
+
+@register_job('archive_transactions', interval_seconds=24 * 60 * 60)
+def archive_job():
+    # Checked daily; a no-op until the oldest hot month passes ARCHIVE_AFTER_DAYS
+    return archive_transactions(pause=current_app.config['JOB_THROTTLE_SECONDS'])
+
+@register_job('ledger_check', interval_seconds=24 * 60 * 60)
+def ledger_check_job():
+    # Report only; balances are repaired by hand with `flask ledger-rebuild --fix`
+    report = check_ledger()
+    for account_id, balance, ledger_balance in report['discrepancies']:
+        current_app.logger.error('Ledger mismatch on account %s: balance %s, ledger %s', account_id, balance, ledger_balance)
+    return {key: len(value) if isinstance(value, list) else value for key, value in report.items()}
+
+jobs_cli = AppGroup('jobs', help='Run and inspect background jobs.')
+bank.cli.add_command(jobs_cli)
+
+@jobs_cli.command('run')
+@click.argument('name', type=click.Choice(sorted(JOBS)))
+def run_job_command(name):
+    """Run a job now, unless another process holds its lock."""
+    run_id = run_job(current_app._get_current_object(), name)
+    if run_id is None:
+        click.echo(f'{name} is already running elsewhere.')
+        return
+    job_run = db.session.get(JobRun, run_id)
+    click.echo(f'{name} {job_run.status} in {job_run.duration_ms} ms.')
+
+@jobs_cli.command('worker')
+def jobs_worker_command():
+    """Run the scheduler in the foreground, outside the web workers."""
+    app = current_app._get_current_object()
+    scheduler = JobScheduler(app, app.config['SCHEDULER_POLL_SECONDS'], app.config['SCHEDULER_WORKERS'])
+    click.echo(f"Scheduling {', '.join(sorted(JOBS))}; press Ctrl+C to stop.")
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+@jobs_cli.command('history')
+@click.option('--limit', default=20, show_default=True)
+def jobs_history_command(limit):
+    """Show recent job runs with their durations."""
+    runs = JobRun.query.order_by(JobRun.id.desc()).limit(limit).all()
+    for job_run in runs:
+        duration = f'{job_run.duration_ms} ms' if job_run.duration_ms is not None else '-'
+        click.echo(f'{job_run.started_at:%Y-%m-%d %H:%M:%S}  {job_run.job_name:<20} {job_run.status:<10} {duration:>10}  {job_run.detail or ""}')
+
+
+# --- Database Setup ---
+# Changes to existing databases are versioned migrations: functions applied once, in
+# the order they are registered, and recorded by name in schema_migration together
+# with their changes. create_all() only ever adds missing tables. A new database gets
+# the current schema from it, so its migrations are recorded without running them.
+# Add new migrations at the end and never rename a released one.
+MONEY_COLUMNS = [('account', 'balance'), ('transaction', 'amount'), ('interest_run', 'total_interest')]
+MIGRATIONS = []
+
+def migration(name):
+    """Register a function taking the migration's connection as the next migration."""
+    def decorator(func):
+        MIGRATIONS.append((name, func))
+        return func
+    return decorator
+
+def _create_indexes(connection, model):
+    for index in model.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+@migration('money_integer_cents')
+def _store_money_as_cents(connection):
+    # Money columns held floating point dollars before they were integer cents
+    inspector = db.inspect(connection)
+    for table, column in MONEY_COLUMNS:
+        if inspector.has_table(table):
+            connection.execute(db.text(f'UPDATE "{table}" SET {column} = CAST(ROUND({column} * 100) AS INTEGER)'))
+
+@migration('transaction_account_timestamp_index')
+def _add_transaction_history_index(connection):
+    # account_id leads this index, so it also serves every other lookup by account;
+    # a separate index on Transaction.account_id alone would only slow down inserts
+    _create_indexes(connection, Transaction)
+
+@migration('transaction_entry_id')
+def _add_transaction_entry_id(connection):
+    if 'entry_id' not in {column['name'] for column in db.inspect(connection).get_columns('transaction')}:
+        connection.execute(db.text('ALTER TABLE "transaction" ADD COLUMN entry_id INTEGER REFERENCES journal_entry (id)'))
+
+@migration('ledger_opening_balances')
+def _post_opening_balances(connection):
+    # Runs on the session, whose transaction is `connection`'s, and commits with the migration
+    backfill_ledger(commit=False)
+
+@migration('account_user_id_index')
+def _add_account_user_index(connection):
+    # Dashboards, account summaries and ownership checks all look accounts up by user
+    _create_indexes(connection, Account)
+
+@migration('card_account_id_index')
+def _add_card_account_index(connection):
+    _create_indexes(connection, Card)
+
+@migration('sqlite_timestamp_microseconds')
+def _add_timestamp_microseconds(connection):
+    # Rows written while timestamps defaulted to CURRENT_TIMESTAMP are stored without
+    # the microseconds SQLAlchemy binds, so history cursors never matched them. The
+    # append-only ledger tables keep their original values.
+    if connection.dialect.name != 'sqlite':
+        return
+    inspector = db.inspect(connection)
+    tables = [table for table in db.metadata.sorted_tables
+              if table not in (JournalEntry.__table__, Posting.__table__) and inspector.has_table(table.name)]
+    tables += [archive_table(month) for month in connection.execute(db.select(ArchiveMonth.month)).scalars()]
+    for table in tables:
+        for column in table.columns:
+            if isinstance(column.type, db.DateTime):
+                connection.execute(db.text(
+                    f'UPDATE "{table.name}" SET "{column.name}" = "{column.name}" || \'.000000\' '
+                    f'WHERE length("{column.name}") = 19'))
+
+@migration('idempotency_key_per_account')
+def _scope_idempotency_keys(connection):
+    # Keys were unique across all customers; they are now unique per source account
+    table = IdempotentTransfer.__tablename__
+    if 'from_account_id' in db.inspect(connection).get_pk_constraint(table)['constrained_columns']:
+        return
+    if connection.dialect.name == 'sqlite': # SQLite can't change a primary key in place
+        connection.execute(db.text(f'ALTER TABLE {table} RENAME TO {table}_old'))
+        IdempotentTransfer.__table__.create(connection)
+        columns = ', '.join(column.name for column in IdempotentTransfer.__table__.columns)
+        connection.execute(db.text(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_old'))
+        connection.execute(db.text(f'DROP TABLE {table}_old'))
+    else:
+        connection.execute(db.text(f'ALTER TABLE {table} DROP CONSTRAINT {table}_pkey, '
+                                   f'ADD PRIMARY KEY (from_account_id, idempotency_key)'))
+
+@migration('transaction_autoincrement')
+def _stop_transaction_id_reuse(connection):
+    # SQLite hands out the id of a deleted row again once it was the highest, and
+    # archived rows are matched to hot ones by id. AUTOINCREMENT needs a new table.
+    if connection.dialect.name != 'sqlite':
+        return
+    if connection.execute(db.text("SELECT 1 FROM sqlite_master WHERE name = 'transaction' "
+                                  "AND sql LIKE '%AUTOINCREMENT%'")).first():
+        return
+    table = Transaction.__tablename__
+    for index in Transaction.__table__.indexes:
+        connection.execute(db.text(f'DROP INDEX IF EXISTS {index.name}'))
+    connection.execute(db.text(f'ALTER TABLE "{table}" RENAME TO {table}_old'))
+    Transaction.__table__.create(connection)
+    columns = ', '.join(column.name for column in Transaction.__table__.columns)
+    connection.execute(db.text(f'INSERT INTO "{table}" ({columns}) SELECT {columns} FROM {table}_old'))
+    connection.execute(db.text(f'DROP TABLE {table}_old'))
+    # Ids already moved to the archive count as used too
+    archives = [archive_table(month) for month in connection.execute(db.select(ArchiveMonth.month)).scalars()]
+    highest = max([connection.execute(db.select(db.func.max(archive.c.id))).scalar() or 0 for archive in archives]
+                  + [connection.execute(db.select(db.func.max(Transaction.id))).scalar() or 0])
+    connection.execute(db.text("DELETE FROM sqlite_sequence WHERE name = :name"), {'name': table})
+    connection.execute(db.text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                       {'name': table, 'seq': highest})
+
+def pending_migrations():
+    applied = set(db.session.execute(db.select(SchemaMigration.name)).scalars())
+    return [name for name, _ in MIGRATIONS if name not in applied]
+
+def init_database():
+    """Create missing tables and apply pending migrations; returns the names of those run.
+
+    Run it once per deploy (`flask init-db`), before starting the web workers.
+    """
+    new_database = not db.inspect(db.engine).has_table('account')
+    db.create_all()
+    pending = set(pending_migrations())
+    applied = []
+    for name, func in MIGRATIONS:
+        if name not in pending:
+            continue
+        if not new_database:
+            func(db.session.connection())
+            applied.append(name)
+        db.session.add(SchemaMigration(name=name))
         db.session.commit()
-        print("Applied monthly interest to savings accounts.")
+    return applied
+
+@bank.cli.command('init-db')
+def init_db_command():
+    """Create or upgrade the database schema."""
+    for name in init_database():
+        click.echo(f'Applied migration {name}.')
+    click.echo('Database is up to date.')
+
+# --- Application Factory ---
+def load_instance_secret(instance_path, name):
+    """A random key from instance/<name>, generated on first use.
+
+    The file is created atomically, so workers starting together all read the same
+    key, and it stays the same across workers and restarts.
+    """
+    path = os.path.join(instance_path, name)
+    if not os.path.exists(path):
+        os.makedirs(instance_path, exist_ok=True)
+        fd, candidate = tempfile.mkstemp(dir=instance_path)
+        with os.fdopen(fd, 'w') as out:
+            out.write(secrets.token_hex(32))
+        try:
+            os.link(candidate, path) # Fails if another process got there first; keep theirs
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(candidate)
+    with open(path) as key_file:
+        return key_file.read().strip()
+
+def create_app(config=None):
+    """Build the Flask app.
+
+    Settings are DEFAULT_CONFIG, then DATABASE_URL, a Python file named by BANK_SETTINGS,
+    BANK_* environment variables (parsed as JSON, e.g. BANK_DB_POOL_SIZE=30 or
+    BANK_SCHEDULER_ENABLED=true) and finally the `config` mapping. All setup happens
+    here, so a server that loads the app before forking its workers (gunicorn --preload)
+    does it once; each forked worker only drops the connections it inherited.
+    """
+    app = Flask(__name__, template_folder='../frontend/templates', static_folder='../frontend/static')
+    app.config.from_mapping(DEFAULT_CONFIG)
+    if os.environ.get('DATABASE_URL'):
+        app.config['SQLALCHEMY_DATABASE_URI'] = os.environ['DATABASE_URL']
+    app.config.from_envvar('BANK_SETTINGS', silent=True)
+    app.config.from_prefixed_env('BANK')
+    app.config.from_mapping(config or {})
+    app.config['SECRET_KEY'] = app.config['SECRET_KEY'] or load_instance_secret(app.instance_path, 'secret_key')
+    app.config['NUMBER_PERMUTATION_KEY'] = (app.config['NUMBER_PERMUTATION_KEY']
+                                            or load_instance_secret(app.instance_path, 'number_permutation_key'))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database_engine_options(app.config)
+    app.logger.setLevel(app.config['LOG_LEVEL'])
+
+    db.init_app(app)
+    cache.init_app(app)
+    init_numbering(app)
+    if app.config['INSTRUMENTATION_ENABLED']:
+        instrumentation.init_app(app)
+    app.register_blueprint(bank)
+    app.register_blueprint(api)
 
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', functools.partial(_configure_sqlite_connection, app.config))
+    db.configure_mappers() # Otherwise done by the first query of every worker
+    _apps.add(app)
+    return app
+
+_apps = weakref.WeakSet() # Apps created in this process, for the fork hook
+
+def _reset_apps_after_fork():
+    # Inherited pooled connections and reserved number blocks belong to the parent
+    for app in list(_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+        app.extensions['numbering']['allocator'].reset()
+
+os.register_at_fork(after_in_child=_reset_apps_after_fork)
 
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
-        db.create_all() # Create database tables if they don't exist
-    
-    # For demonstration, let's schedule interest calculation (in a real app, use APScheduler or Celery)
-    # import threading
-    # def run_interest_job():
-    #     import time
-    #     while True:
-    #         time.sleep(60*60*24*30) # Roughly monthly
-    #         apply_interest()
-    # if os.environ.get('WERKZEUG_RUN_MAIN') == 'true': # Ensure this runs only once with Flask reloader
-    #    interest_thread = threading.Thread(target=run_interest_job)
-    #    interest_thread.daemon = True # Allow main program to exit even if thread is running
-    #    interest_thread.start()
-
-    app.run(debug=True, port=5001) 
\ No newline at end of file
+        init_database()
+
+    # Set BANK_SCHEDULER_ENABLED=true to run interest accrual and other periodic jobs in-process
+    app.run(debug=True, port=5001)
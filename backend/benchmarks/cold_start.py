@@ -0,0 +1,82 @@
+"""Measure how long a fresh worker process takes to serve its first request.
+
+Each sample runs in a new Python process, the way a gunicorn worker or a
+`flask run` reload starts, and times three phases: importing app.py, calling
+create_app() and serving GET /login through the test client. The scratch
+database is created and migrated once beforehand, so the samples measure
+startup rather than schema creation. Prints the median and p95 of each phase
+and writes the results as JSON; with --target-ms, exits with status 1 if the
+median total is above it.
+
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --runs 30 --target-ms 700
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from common import BACKEND_DIR, percentile, use_scratch_database, write_results
+
+PHASES = ('import', 'create_app', 'first_request', 'total')
+
+# Runs in the child process; prints one JSON line of phase timings in seconds.
+SAMPLE = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+response = application.test_client().get('/login')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first_request': served - created, 'total': served - started}))
+'''
+
+SETUP = '''
+import app
+with app.create_app().app_context():
+    app.init_database()
+'''
+
+
+def run_python(code):
+    result = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=dict(os.environ),
+                            capture_output=True, text=True, check=True)
+    return result.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=15, help='Fresh processes to time')
+    parser.add_argument('--target-ms', type=float, help='Fail if the median total startup time is above this')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/cold_start-<commit>-<time>.json)')
+    args = parser.parse_args()
+
+    use_scratch_database('cold-start')
+    run_python(SETUP) # Also warms the bytecode cache, which deployed workers have too
+    samples = [json.loads(run_python(SAMPLE).splitlines()[-1]) for _ in range(args.runs)]
+
+    phases = {}
+    print(f"{'phase':<15}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for phase in PHASES:
+        values = sorted(sample[phase] for sample in samples)
+        phases[phase] = {'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+                         'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+                         'max_ms': round(values[-1] * 1000, 2)}
+        print(f"{phase:<15}{phases[phase]['p50_ms']:>9.1f}{phases[phase]['p95_ms']:>9.1f}"
+              f"{phases[phase]['max_ms']:>9.1f}")
+
+    path = write_results('cold_start', {'config': {'runs': args.runs}, 'phases': phases,
+                                        'target_ms': args.target_ms}, args.output)
+    print(f'Results written to {path}')
+    if args.target_ms is not None and phases['total']['p50_ms'] > args.target_ms:
+        print(f"Median startup {phases['total']['p50_ms']:.1f} ms is above the {args.target_ms:.0f} ms target")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
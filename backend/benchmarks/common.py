@@ -0,0 +1,78 @@
+"""Helpers shared by the benchmark scripts."""
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'benchmarks', 'results')
+
+
+def use_database(path):
+    """Point the app at the SQLite file `path` and make it importable; call before create_app()."""
+    path = os.path.abspath(path)
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('BANK_SECRET_KEY', 'benchmark-secret-key') # Leave instance/secret_key alone
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    return path
+
+
+def use_scratch_database(name):
+    """Point the app at a new SQLite file and make it importable; call before create_app().
+
+    Returns the database path.
+    """
+    return use_database(os.path.join(tempfile.mkdtemp(prefix=f'bank-{name}-'), f'{name}.db'))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def latency_summary(latencies, elapsed, errors=0):
+    """Count, throughput and latency percentiles (in ms) for one operation."""
+    latencies = sorted(latencies)
+    return {
+        'count': len(latencies),
+        'errors': errors,
+        'per_sec': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(name, results, path=None):
+    """Write a results dict as JSON, stamped with the commit and environment; returns the path.
+
+    Defaults to benchmarks/results/<name>-<commit>-<timestamp>.json.
+    """
+    now = datetime.datetime.now()
+    revision = git_revision()
+    results = dict(results, benchmark=name, commit=revision, recorded_at=now.isoformat(timespec='seconds'),
+                   python=platform.python_version(), platform=platform.platform(), cpus=os.cpu_count())
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{name}-{revision or 'unknown'}-{now:%Y%m%d-%H%M%S}.json")
+    with open(path, 'w') as out:
+        json.dump(results, out, indent=2, sort_keys=True)
+        out.write('\n')
+    return path
@@ -0,0 +1,66 @@
+"""Compare two benchmark result files, e.g. from before and after a change.
+
+Prints throughput and p50/p95/p99 per operation side by side, with the change in
+percent. With --max-regression, exits with status 1 if any operation's p95
+latency got worse by more than that percentage.
+
+    python benchmarks/compare.py results/workload-abc123-....json results/workload-def456-....json
+    python benchmarks/compare.py old.json new.json --max-regression 20
+"""
+import argparse
+import json
+import sys
+
+METRICS = ('per_sec', 'p50_ms', 'p95_ms', 'p99_ms')
+
+
+def _change(old, new):
+    return (new - old) / old * 100 if old else 0.0
+
+
+def compare(baseline, candidate):
+    """Rows of (operation, metric, old, new, percent change) for operations in both files."""
+    rows = []
+    old_operations = dict(baseline['operations'], total=baseline['total'])
+    new_operations = dict(candidate['operations'], total=candidate['total'])
+    for operation in old_operations:
+        if operation not in new_operations:
+            continue
+        for metric in METRICS:
+            old, new = old_operations[operation][metric], new_operations[operation][metric]
+            rows.append((operation, metric, old, new, _change(old, new)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--max-regression', type=float, help='Fail if a p95 latency grows by more than this percent')
+    args = parser.parse_args()
+    with open(args.baseline) as baseline_file, open(args.candidate) as candidate_file:
+        baseline, candidate = json.load(baseline_file), json.load(candidate_file)
+
+    print(f"baseline {baseline.get('commit')} ({baseline.get('recorded_at')}) -> "
+          f"candidate {candidate.get('commit')} ({candidate.get('recorded_at')})")
+    if baseline.get('config') != candidate.get('config'):
+        print('warning: the runs used different settings')
+    print(f"{'operation':<14}{'metric':<9}{'baseline':>11}{'candidate':>11}{'change':>9}")
+    regressions = []
+    for operation, metric, old, new, change in compare(baseline, candidate):
+        print(f'{operation:<14}{metric:<9}{old:>11.1f}{new:>11.1f}{change:>+8.1f}%')
+        if metric == 'p95_ms' and args.max_regression is not None and change > args.max_regression:
+            regressions.append(operation)
+
+    interest = baseline.get('interest'), candidate.get('interest')
+    if all(interest):
+        old, new = interest[0]['accounts_per_sec'], interest[1]['accounts_per_sec']
+        print(f"{'interest':<14}{'acct/s':<9}{old:>11.1f}{new:>11.1f}{_change(old, new):>+8.1f}%")
+
+    if regressions:
+        print(f"p95 regressed by more than {args.max_regression}% for: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Check that transaction history pages through every row exactly once.
+
+Seeds a scratch database with users but no history, then makes deposits and
+transfers through the app's own routes, quickly enough that many rows share a
+second. Pages through the account's history with small pages, older and then
+newer, through the JSON API and the HTML pager. Any page that repeats or skips a
+row is reported and the script exits with status 1.
+
+    python benchmarks/history_paging.py
+    python benchmarks/history_paging.py --deposits 50 --transfers 20 --limit 7
+"""
+import argparse
+import html
+import re
+import sys
+
+from common import use_scratch_database
+
+if __name__ == '__main__':
+    use_scratch_database('paging')
+
+from app import db, Account, Transaction, User  # noqa: E402
+from seed import PASSWORD, app, seed_database  # noqa: E402
+
+OLDER_LINK = re.compile(r'<a href="([^"]+)" class="older">')
+MAX_PAGES = 1000 # Stop following links that never end
+
+
+def follow_api(client, account_id, limit, direction, cursor=None):
+    """Every API page in one direction, starting at `cursor`.
+
+    Returns the pages' ids (each page newest first) and the last page's cursor in
+    the opposite direction.
+    """
+    pages, back = [], None
+    while len(pages) < MAX_PAGES:
+        query = f'?limit={limit}'
+        if cursor:
+            query += f"&{'before' if direction == 'older' else 'after'}={cursor}"
+        body = client.get(f'/api/v1/accounts/{account_id}/transactions{query}').get_json()
+        pages.append([transaction['id'] for transaction in body['transactions']])
+        cursor, back = body[direction], body['newer' if direction == 'older' else 'older']
+        if not cursor:
+            break
+    return pages, back
+
+
+def count_html_pages(client, account_id, limit):
+    path, pages = f'/account/{account_id}/transactions?limit={limit}', 0
+    while path and pages < MAX_PAGES:
+        match = OLDER_LINK.search(client.get(path).get_data(as_text=True))
+        path = html.unescape(match.group(1)) if match else None
+        pages += 1
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--deposits', type=int, default=20)
+    parser.add_argument('--transfers', type=int, default=10)
+    parser.add_argument('--limit', type=int, default=3, help='Rows per page')
+    args = parser.parse_args()
+
+    seeded = seed_database(users=2, accounts_per_user=1, cards_per_account=0, transactions_per_account=0)
+    client = app.test_client()
+    client.post('/login', data={'username': seeded['usernames'][0], 'password': PASSWORD})
+    with app.app_context():
+        account_id = db.session.execute(
+            db.select(Account.id).join(User).where(User.username == seeded['usernames'][0])).scalar()
+    target = seeded['account_numbers'][1] # user1's account
+
+    for _ in range(args.deposits):
+        client.post('/deposit', data={'account_id': account_id, 'amount': '10.00'})
+    for _ in range(args.transfers):
+        client.post('/transfer', data={'from_account': account_id, 'to_account_number': target, 'amount': '1.00'})
+    with app.app_context():
+        expected = db.session.execute(
+            db.select(Transaction.id).where(Transaction.account_id == account_id)
+            .order_by(Transaction.timestamp.desc(), Transaction.id.desc())).scalars().all()
+
+    failures = []
+    if len(expected) != args.deposits + args.transfers:
+        failures.append(f'{len(expected)} transactions recorded, expected {args.deposits + args.transfers}')
+    older_pages, newer_cursor = follow_api(client, account_id, args.limit, 'older')
+    older = [tx_id for page in older_pages for tx_id in page]
+    if older != expected:
+        failures.append(f'older pages returned {older[:12]}..., expected {expected[:12]}...')
+    # Back from the oldest page towards the newest; every row but those on that page
+    newer_pages, _ = follow_api(client, account_id, args.limit, 'newer', newer_cursor)
+    newer = [tx_id for page in reversed(newer_pages) for tx_id in page]
+    if newer != expected[:len(expected) - len(older_pages[-1])]:
+        failures.append(f'newer pages returned {newer[:12]}..., expected {expected[:12]}...')
+    html_pages = count_html_pages(client, account_id, args.limit)
+    expected_pages = -(-len(expected) // args.limit)
+    if html_pages != expected_pages:
+        failures.append(f'HTML pager followed {html_pages} pages, expected {expected_pages}')
+
+    print(f'{len(expected)} transactions, {len(older_pages)} API pages and {html_pages} HTML pages of {args.limit}')
+    if failures:
+        print('History paging is broken:\n  ' + '\n  '.join(failures))
+        sys.exit(1)
+    print('Every transaction appeared exactly once in both directions.')
+
+
+if __name__ == '__main__':
+    main()
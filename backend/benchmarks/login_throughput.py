@@ -0,0 +1,96 @@
+"""Login throughput at different password hashing costs.
+
+For each hashing method, creates users hashed with that method in a scratch
+database and then logs them in concurrently through the Flask test client,
+once hashing in the request threads and once in the hashing process pool.
+Reports logins/sec and latency percentiles for each combination.
+
+    python benchmarks/login_throughput.py --logins 200 --threads 8
+    python benchmarks/login_throughput.py --method pbkdf2:sha256:600000 --method scrypt:32768:8:1
+"""
+import argparse
+import os
+import threading
+import time
+
+from common import percentile, use_scratch_database
+
+if __name__ == '__main__':
+    use_scratch_database('login')
+
+from app import create_app, db, User, hash_password, init_database, shutdown_password_hashing  # noqa: E402
+
+app = create_app()
+
+DEFAULT_METHODS = ['pbkdf2:sha256:260000', 'pbkdf2:sha256:600000', 'scrypt:16384:8:1', 'scrypt:32768:8:1']
+PASSWORD = 'correct horse battery staple'
+
+
+def seed_users(method, count):
+    app.config['PASSWORD_HASH_METHOD'] = method
+    app.config['PASSWORD_HASH_WORKERS'] = 0
+    prefix = method.replace(':', '_')
+    with app.app_context():
+        password_hash = hash_password(PASSWORD)  # Same hash for everyone; verification cost is what matters
+        db.session.execute(db.insert(User), [
+            {'username': f'{prefix}-{index}', 'password_hash': password_hash} for index in range(count)
+        ])
+        db.session.commit()
+    return [f'{prefix}-{index}' for index in range(count)]
+
+
+def drive_logins(usernames, logins, threads):
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+
+    def worker(offset):
+        client = app.test_client()
+        local = []
+        for index in range(offset, logins, threads):
+            username = usernames[index % len(usernames)]
+            started = time.perf_counter()
+            response = client.post('/login', data={'username': username, 'password': PASSWORD})
+            local.append(time.perf_counter() - started)
+            if response.status_code != 302:
+                failures.append(username)
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(offset,)) for offset in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - started, sorted(latencies), failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--method', action='append', help='Hash method to test (repeatable).')
+    parser.add_argument('--logins', type=int, default=100, help='Logins per method and mode.')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent login threads.')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help='Hashing processes for the pooled mode.')
+    args = parser.parse_args()
+
+    with app.app_context():
+        init_database()
+
+    print(f"{'method':<24} {'hashing':<12} {'logins/sec':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for method in args.method or DEFAULT_METHODS:
+        usernames = seed_users(method, min(args.logins, 50))
+        for workers in (0, args.workers):
+            app.config['PASSWORD_HASH_WORKERS'] = workers
+            elapsed, latencies, failures = drive_logins(usernames, args.logins, args.threads)
+            shutdown_password_hashing()
+            mode = 'in-request' if workers == 0 else f'{workers} procs'
+            print(f'{method:<24} {mode:<12} {len(latencies) / elapsed:>10.1f} '
+                  f'{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f}')
+            if failures:
+                print(f'  {len(failures)} logins failed')
+
+
+if __name__ == '__main__':
+    main()
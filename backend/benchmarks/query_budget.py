@@ -0,0 +1,99 @@
+"""Check that account pages stay within a fixed number of SQL statements.
+
+Seeds a small scratch database, logs in as a seeded user and requests each page
+twice: once with an empty cache and once warm. A page that runs more statements
+than its budget (for example because a relationship is loaded lazily per row)
+is reported with the statements it ran, and the script exits with status 1.
+
+    python benchmarks/query_budget.py
+    python benchmarks/query_budget.py --verbose
+"""
+import argparse
+import sys
+
+from common import use_scratch_database
+
+if __name__ == '__main__':
+    use_scratch_database('budget')
+
+from sqlalchemy import event  # noqa: E402
+
+from app import cache, db, Account, User  # noqa: E402
+from seed import PASSWORD, app, seed_database  # noqa: E402
+
+# (name, method, path, form, budget with an empty cache, budget with a warm cache).
+# {account} is replaced by one of the user's account ids and {target} by another
+# user's account number. Writes invalidate the cache, so their second run is cold too.
+PAGES = [
+    ('dashboard', 'GET', '/dashboard', None, 2, 0),
+    ('account_details', 'GET', '/account/{account}', None, 2, 0),
+    ('account_transactions', 'GET', '/account/{account}/transactions', None, 3, 1),
+    ('account_cards', 'GET', '/account/{account}/cards', None, 1, 1),
+    ('transfer_form', 'GET', '/transfer', None, 2, 0),
+    ('transfer_invalid', 'POST', '/transfer', {'from_account': '{account}', 'to_account_number': '{target}', 'amount': 'abc'}, 2, 0),
+    ('transfer', 'POST', '/transfer', {'from_account': '{account}', 'to_account_number': '{target}', 'amount': '1.00'}, 9, 9),
+    ('deposit', 'POST', '/deposit', {'account_id': '{account}', 'amount': '1.00'}, 6, 6),
+    ('withdraw', 'POST', '/withdraw', {'account_id': '{account}', 'amount': '1.00'}, 6, 6),
+    ('api_accounts', 'GET', '/api/v1/accounts?include=transactions,cards', None, 5, 3),
+    ('api_account_cards', 'GET', '/api/v1/accounts/{account}/cards', None, 1, 1),
+]
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(' '.join(statement.split()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--verbose', action='store_true', help='Print every statement')
+    args = parser.parse_args()
+
+    seeded = seed_database(users=3, accounts_per_user=2, cards_per_account=2, transactions_per_account=60)
+    client = app.test_client()
+    client.post('/login', data={'username': seeded['usernames'][0], 'password': PASSWORD})
+    client.get('/dashboard') # First request of the process also logs the database settings
+    with app.app_context():
+        account_ids = db.session.execute(
+            db.select(Account.id).join(User).where(User.username == seeded['usernames'][0]).order_by(Account.id)
+        ).scalars().all()
+        target = db.session.execute(
+            db.select(Account.account_number).where(Account.id.not_in(account_ids)).limit(1)).scalar()
+    values = {'account': account_ids[0], 'target': target}
+
+    counter = StatementCounter()
+    failures = []
+    print(f"{'page':<22}{'cold':>6}{'budget':>8}{'warm':>6}{'budget':>8}")
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', counter)
+        for name, method, path, form, cold_budget, warm_budget in PAGES:
+            path = path.format(**values)
+            form = {key: value.format(**values) for key, value in form.items()} if form else None
+            counts = []
+            for warm, budget in ((False, cold_budget), (True, warm_budget)):
+                if not warm:
+                    cache.clear()
+                counter.statements = []
+                response = client.open(path, method=method, data=form)
+                if response.status_code >= 400:
+                    failures.append(f'{name}: HTTP {response.status_code}')
+                counts.append(len(counter.statements))
+                if len(counter.statements) > budget:
+                    failures.append(f'{name}: {len(counter.statements)} statements, budget {budget}')
+                if args.verbose or len(counter.statements) > budget:
+                    for statement in counter.statements:
+                        print(f'    {statement[:160]}')
+            print(f'{name:<22}{counts[0]:>6}{cold_budget:>8}{counts[1]:>6}{warm_budget:>8}')
+        event.remove(db.engine, 'before_cursor_execute', counter)
+
+    if failures:
+        print('Over budget:\n  ' + '\n  '.join(failures))
+        sys.exit(1)
+    print('All pages within their SQL statement budgets.')
+
+
+if __name__ == '__main__':
+    main()
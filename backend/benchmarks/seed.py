@@ -0,0 +1,147 @@
+"""Seed a database with synthetic users, accounts, cards and transaction history.
+
+Every user is named user<N> with the same password. Transactions are spread over
+the last --days days and each account's balance equals its history, so balance
+snapshots and reconciliation work on the seeded data. Rows are bulk inserted.
+
+    python benchmarks/seed.py --users 1000 --accounts-per-user 2 --transactions-per-account 200
+    python benchmarks/seed.py --database /tmp/bank-big.db --users 20000
+"""
+import argparse
+import datetime
+import random
+import time
+from decimal import Decimal
+
+from common import use_database, use_scratch_database
+
+if __name__ == '__main__':
+    _parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    _parser.add_argument('--database', help='SQLite file to (re)create; defaults to a scratch file')
+    _parser.add_argument('--users', type=int, default=100)
+    _parser.add_argument('--accounts-per-user', type=int, default=2)
+    _parser.add_argument('--cards-per-account', type=int, default=1)
+    _parser.add_argument('--transactions-per-account', type=int, default=50)
+    _parser.add_argument('--days', type=int, default=365, help='Spread history over this many days')
+    _parser.add_argument('--seed', type=int, default=1)
+    _args = _parser.parse_args()
+    if _args.database:
+        use_database(_args.database)
+    else:
+        use_scratch_database('seed')
+
+from app import (create_app, db, User, Account, Transaction, Card, allocate_account_numbers,  # noqa: E402
+                 allocate_card_numbers, backfill_ledger, drop_archive_tables, generate_card_expiry, generate_cvv,
+                 hash_password, init_database, utcnow)
+
+app = create_app()
+
+PASSWORD = 'benchmark password'
+ACCOUNT_TYPES = ('Savings', 'Checking')
+INSERT_BATCH_SIZE = 10000
+CREDIT_TYPES = ('deposit', 'interest', 'transfer_in')
+DEBIT_TYPES = ('withdrawal', 'transfer_out')
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        db.session.execute(db.insert(model), rows[start:start + INSERT_BATCH_SIZE])
+
+
+def _history(account_id, count, days, rng, now):
+    """Random transactions for one account, oldest first, and the balance they add up to."""
+    offsets = sorted(rng.uniform(0, days * 86400) for _ in range(count))
+    balance = Decimal('0.00')
+    rows = []
+    for index, offset in enumerate(reversed(offsets)):
+        if index == 0:
+            tx_type, amount = 'deposit', Decimal(rng.randint(100000, 500000)) / 100
+        else:
+            tx_type = rng.choice(CREDIT_TYPES + DEBIT_TYPES)
+            amount = Decimal(rng.randint(100, 20000)) / 100
+            if tx_type in DEBIT_TYPES and amount > balance:
+                tx_type = 'deposit'
+        balance += amount if tx_type in CREDIT_TYPES else -amount
+        rows.append({'account_id': account_id, 'type': tx_type, 'amount': amount,
+                     'timestamp': now - datetime.timedelta(seconds=offset), 'description': f'Seeded {tx_type}'})
+    return rows, balance
+
+
+def seed_database(users=100, accounts_per_user=2, cards_per_account=1, transactions_per_account=50,
+                  days=365, seed=1):
+    """Drop and recreate every table, then fill them. Returns usernames, account numbers and row counts."""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    with app.app_context():
+        drop_archive_tables()
+        db.drop_all()
+        init_database()
+
+        # One hash for everyone: seeding stays fast and logins still pay the full verification cost
+        workers = app.config['PASSWORD_HASH_WORKERS']
+        app.config['PASSWORD_HASH_WORKERS'] = 0
+        password_hash = hash_password(PASSWORD)
+        app.config['PASSWORD_HASH_WORKERS'] = workers
+
+        usernames = [f'user{index}' for index in range(users)]
+        _insert(User, [{'username': username, 'password_hash': password_hash, 'full_name': f'Bench User {index}'}
+                       for index, username in enumerate(usernames)])
+        db.session.commit() # Number blocks are reserved on a separate connection, which SQLite would block
+        user_ids = db.session.execute(db.select(User.id).order_by(User.id)).scalars().all()
+
+        account_numbers = allocate_account_numbers(len(user_ids) * accounts_per_user)
+        _insert(Account, [
+            {'user_id': user_id, 'account_number': account_numbers[index * accounts_per_user + slot],
+             'account_type': ACCOUNT_TYPES[slot % len(ACCOUNT_TYPES)], 'balance': Decimal('0.00')}
+            for index, user_id in enumerate(user_ids) for slot in range(accounts_per_user)
+        ])
+        db.session.commit()
+        account_ids = db.session.execute(db.select(Account.id).order_by(Account.id)).scalars().all()
+
+        card_numbers = allocate_card_numbers(len(account_ids) * cards_per_account)
+        _insert(Card, [
+            {'account_id': account_id, 'card_number': card_numbers[index * cards_per_account + slot],
+             'expiry_date': generate_card_expiry(), 'cvv': generate_cvv(), 'is_active': True}
+            for index, account_id in enumerate(account_ids) for slot in range(cards_per_account)
+        ])
+
+        now = utcnow()
+        pending, balances, transaction_count = [], [], 0
+        for account_id in account_ids:
+            rows, balance = _history(account_id, transactions_per_account, days, rng, now)
+            pending.extend(rows)
+            balances.append({'b_id': account_id, 'b_balance': balance})
+            if len(pending) >= INSERT_BATCH_SIZE:
+                _insert(Transaction, pending)
+                transaction_count += len(pending)
+                pending = []
+        _insert(Transaction, pending)
+        transaction_count += len(pending)
+        table = Account.__table__
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam('b_id')).values(balance=db.bindparam('b_balance')),
+            balances)
+        db.session.commit()
+        backfill_ledger() # Seeded history has no journal entries, so post each balance as an opening entry
+
+    return {
+        'usernames': usernames,
+        'password': PASSWORD,
+        'account_numbers': account_numbers,
+        'counts': {'users': len(user_ids), 'accounts': len(account_ids), 'cards': len(card_numbers),
+                   'transactions': transaction_count},
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def main(args):
+    seeded = seed_database(users=args.users, accounts_per_user=args.accounts_per_user,
+                           cards_per_account=args.cards_per_account,
+                           transactions_per_account=args.transactions_per_account, days=args.days, seed=args.seed)
+    counts = ', '.join(f'{count} {name}' for name, count in seeded['counts'].items())
+    print(f"Seeded {counts} in {seeded['seconds']:.2f}s into {app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f"Log in as user0 .. user{args.users - 1} with password {PASSWORD!r}")
+
+
+if __name__ == '__main__':
+    main(_args)
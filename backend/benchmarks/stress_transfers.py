@@ -0,0 +1,133 @@
+"""Concurrency stress test for money movement.
+
+Seeds a scratch SQLite database with accounts, then hammers record_transfer from
+several processes and threads at once. At the end it checks that no money was
+created or destroyed and reports transfers/sec and latency percentiles.
+
+    python benchmarks/stress_transfers.py --accounts 200 --transfers 5000 --processes 4 --threads 8
+"""
+import argparse
+import random
+import threading
+import time
+from decimal import Decimal
+from multiprocessing import Pool
+
+from common import percentile, use_scratch_database
+
+if __name__ == '__main__':
+    # The database has to be chosen before create_app() builds the engine
+    _db_path = use_scratch_database('stress')
+
+from app import create_app, db, User, Account, Transaction, record_transfer, run_in_transaction  # noqa: E402
+
+app = create_app()
+
+OPENING_BALANCE = Decimal('1000.00')
+
+
+def seed(account_count):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username='stress')
+        user.set_password('stress')
+        db.session.add(user)
+        db.session.commit()
+        db.session.execute(db.insert(Account), [
+            {'user_id': user.id, 'account_number': str(1000000000 + i), 'balance': OPENING_BALANCE}
+            for i in range(account_count)
+        ])
+        db.session.commit()
+        return [account_id for (account_id,) in db.session.execute(db.select(Account.id)).all()]
+
+
+def total_money():
+    with app.app_context():
+        return db.session.execute(db.select(db.func.sum(Account.balance))).scalar()
+
+
+def _transfer_thread(account_ids, count, seed_value, latencies, outcomes):
+    rng = random.Random(seed_value)
+    with app.app_context():
+        accounts = {account.id: account for account in Account.query.filter(Account.id.in_(account_ids)).all()}
+        db.session.expunge_all()
+        for _ in range(count):
+            from_id, to_id = rng.sample(account_ids, 2)
+            amount = Decimal(rng.randint(1, 50000)) / 100
+            started = time.perf_counter()
+            try:
+                ok = run_in_transaction(lambda: record_transfer(accounts[from_id], accounts[to_id], amount, 'stress'))
+                outcomes['ok' if ok else 'insufficient'] += 1
+            except Exception:
+                db.session.rollback()
+                outcomes['error'] += 1
+            latencies.append(time.perf_counter() - started)
+
+
+def run_process(args):
+    """Run `threads` transfer threads in this process; returns (latencies, outcomes)."""
+    account_ids, transfers, threads, seed_value = args
+    latencies = []
+    outcomes = {'ok': 0, 'insufficient': 0, 'error': 0}
+    per_thread = transfers // threads
+    workers = []
+    for index in range(threads):
+        thread_latencies = []
+        thread_outcomes = {'ok': 0, 'insufficient': 0, 'error': 0}
+        worker = threading.Thread(target=_transfer_thread,
+                                  args=(account_ids, per_thread, seed_value * 1000 + index,
+                                        thread_latencies, thread_outcomes))
+        worker.start()
+        workers.append((worker, thread_latencies, thread_outcomes))
+    for worker, thread_latencies, thread_outcomes in workers:
+        worker.join()
+        latencies.extend(thread_latencies)
+        for key, value in thread_outcomes.items():
+            outcomes[key] += value
+    return latencies, outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--transfers', type=int, default=2000, help='Transfers per process')
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='Threads per process')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    account_ids = seed(args.accounts)
+    before = total_money()
+    print(f'Seeded {len(account_ids)} accounts holding ${before:,.2f} in {_db_path}')
+
+    started = time.perf_counter()
+    jobs = [(account_ids, args.transfers, args.threads, args.seed + index) for index in range(args.processes)]
+    with Pool(args.processes) as pool:
+        results = pool.map(run_process, jobs)
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for process_latencies, _ in results for latency in process_latencies)
+    outcomes = {'ok': 0, 'insufficient': 0, 'error': 0}
+    for _, process_outcomes in results:
+        for key, value in process_outcomes.items():
+            outcomes[key] += value
+
+    after = total_money()
+    with app.app_context():
+        transfers_out = Transaction.query.filter_by(type='transfer_out').count()
+        transfers_in = Transaction.query.filter_by(type='transfer_in').count()
+
+    print(f"{len(latencies)} attempts in {elapsed:.2f}s: {outcomes['ok']} transferred, "
+          f"{outcomes['insufficient']} insufficient funds, {outcomes['error']} errors")
+    print(f'Throughput: {len(latencies) / elapsed:.0f} transfers/sec')
+    print(f'Latency: p50 {percentile(latencies, 0.50) * 1000:.1f} ms, '
+          f'p95 {percentile(latencies, 0.95) * 1000:.1f} ms, p99 {percentile(latencies, 0.99) * 1000:.1f} ms')
+
+    assert after == before, f'money not conserved: ${before} before, ${after} after'
+    assert transfers_out == transfers_in == outcomes['ok'], 'transaction log does not match completed transfers'
+    print(f'OK: total money conserved at ${after:,.2f}')
+
+
+if __name__ == '__main__':
+    main()
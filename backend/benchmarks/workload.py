@@ -0,0 +1,266 @@
+"""Mixed-workload benchmark for the banking pages and JSON API.
+
+Seeds a scratch database (see seed.py), then runs virtual users from several
+processes with several threads each. Every virtual user logs in and performs a
+weighted mix of logins, dashboard views, history paging, API account reads,
+deposits and transfers. Afterwards a monthly interest run is timed over the
+seeded accounts.
+
+--driver client sends the requests through the Flask test client inside each
+process. --driver http sends real HTTP requests, to --url if given or otherwise to
+a `flask run` server started for the benchmark. A server given with --url must
+run against the --database file, since that is what gets seeded. Results
+(throughput and latency percentiles per operation) are printed and written as
+JSON for compare.py.
+
+    python benchmarks/workload.py --users 200 --processes 4 --threads 4 --ops 50
+    python benchmarks/workload.py --driver http --output results/http.json
+"""
+import argparse
+import html
+import http.cookiejar
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from common import BACKEND_DIR, latency_summary, use_database, use_scratch_database, write_results
+
+if __name__ == '__main__':
+    _parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    _parser.add_argument('--driver', choices=('client', 'http'), default='client')
+    _parser.add_argument('--url',
+                         help='Server to benchmark with --driver http, e.g. http://127.0.0.1:8000; '
+                              'it must use the --database file, which is reseeded')
+    _parser.add_argument('--database', help='SQLite file to seed; defaults to a scratch file')
+    _parser.add_argument('--users', type=int, default=100, help='Seeded users')
+    _parser.add_argument('--accounts-per-user', type=int, default=2)
+    _parser.add_argument('--cards-per-account', type=int, default=1)
+    _parser.add_argument('--transactions-per-account', type=int, default=50)
+    _parser.add_argument('--processes', type=int, default=2)
+    _parser.add_argument('--threads', type=int, default=4, help='Virtual users per process')
+    _parser.add_argument('--ops', type=int, default=50, help='Operations per virtual user')
+    _parser.add_argument('--seed', type=int, default=1)
+    _parser.add_argument('--skip-interest', action='store_true')
+    _parser.add_argument('--output', help='Results file (default: benchmarks/results/workload-<commit>-<time>.json)')
+    _args = _parser.parse_args()
+    if _args.database:
+        use_database(_args.database)
+    else:
+        use_scratch_database('workload')
+
+from app import apply_interest, shutdown_password_hashing  # noqa: E402
+from seed import PASSWORD, app, seed_database  # noqa: E402
+
+OPERATION_WEIGHTS = {
+    'login': 5,
+    'dashboard': 30,
+    'history': 20,
+    'api_accounts': 15,
+    'deposit': 10,
+    'transfer': 20,
+}
+HISTORY_PAGES = 3 # Pages followed per history operation, each timed separately
+OLDER_LINK = re.compile(r'<a href="([^"]+)" class="older">')
+
+
+class ClientSession:
+    """A virtual user's cookie session in the Flask test client."""
+
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None):
+        response = self.client.open(path, method=method, data=form)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Report the 302 after a form post instead of fetching the next page, like the test client
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpSession:
+    """A virtual user's cookie session against a real HTTP server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, method, path, form=None):
+        data = urllib.parse.urlencode(form).encode() if form is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read().decode()
+
+
+def run_virtual_user(session, username, account_numbers, ops, rng, latencies, errors):
+    def timed(operation, method, path, form=None):
+        started = time.perf_counter()
+        try:
+            status, body = session.request(method, path, form)
+        except OSError:
+            status, body = None, ''
+        latencies[operation].append(time.perf_counter() - started)
+        if status is None or status >= 400:
+            errors[operation] += 1
+        return status, body
+
+    login = {'username': username, 'password': PASSWORD}
+    timed('login', 'POST', '/login', login)
+    status, body = session.request('GET', '/api/v1/accounts')
+    if status != 200:
+        errors['setup'] += 1
+        return
+    accounts = json.loads(body)['accounts']
+    operations, weights = zip(*OPERATION_WEIGHTS.items())
+
+    for _ in range(ops):
+        operation = rng.choices(operations, weights)[0]
+        account = rng.choice(accounts)
+        if operation == 'login':
+            timed('login', 'POST', '/login', login)
+        elif operation == 'dashboard':
+            timed('dashboard', 'GET', '/dashboard')
+        elif operation == 'api_accounts':
+            timed('api_accounts', 'GET', '/api/v1/accounts')
+        elif operation == 'history':
+            path = f"/account/{account['id']}/transactions"
+            for _ in range(HISTORY_PAGES):
+                _, body = timed('history', 'GET', path)
+                match = OLDER_LINK.search(body)
+                if not match:
+                    break
+                path = html.unescape(match.group(1))
+        elif operation == 'deposit':
+            timed('deposit', 'POST', '/deposit', {'account_id': account['id'], 'amount': f'{rng.randint(100, 5000) / 100:.2f}'})
+        elif operation == 'transfer':
+            timed('transfer', 'POST', '/transfer', {
+                'from_account': account['id'], 'to_account_number': rng.choice(account_numbers),
+                'amount': f'{rng.randint(100, 10000) / 100:.2f}', 'description': 'Benchmark transfer'})
+
+
+def run_process(job):
+    """Run one thread per virtual user; returns ({operation: [latencies]}, {operation: errors})."""
+    driver, url, usernames, account_numbers, ops, seed_value = job
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+
+    def worker(index, username):
+        local_latencies, local_errors = defaultdict(list), defaultdict(int)
+        session = ClientSession() if driver == 'client' else HttpSession(url)
+        run_virtual_user(session, username, account_numbers, ops, random.Random(seed_value * 1000 + index),
+                         local_latencies, local_errors)
+        with lock:
+            for operation, values in local_latencies.items():
+                latencies[operation].extend(values)
+            for operation, count in local_errors.items():
+                errors[operation] += count
+
+    threads = [threading.Thread(target=worker, args=(index, username)) for index, username in enumerate(usernames)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    shutdown_password_hashing() # Otherwise this process waits on the idle hashing processes at exit
+    return dict(latencies), dict(errors)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server():
+    """Start `flask run` on the benchmark database; returns (process, base_url)."""
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port), '--no-reload', '--no-debugger'],
+        cwd=BACKEND_DIR, env=dict(os.environ), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server, f'http://127.0.0.1:{port}'
+        except OSError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError('benchmark server did not start')
+
+
+def main(args):
+    seeded = seed_database(users=args.users, accounts_per_user=args.accounts_per_user,
+                           cards_per_account=args.cards_per_account,
+                           transactions_per_account=args.transactions_per_account, seed=args.seed)
+    counts = ', '.join(f'{count} {name}' for name, count in seeded['counts'].items())
+    print(f"Seeded {counts} in {seeded['seconds']:.2f}s")
+
+    server, url = None, args.url
+    if args.driver == 'http' and not url:
+        server, url = start_server()
+    rng = random.Random(args.seed)
+    jobs = [(args.driver, url, [rng.choice(seeded['usernames']) for _ in range(args.threads)],
+             seeded['account_numbers'], args.ops, args.seed + index)
+            for index in range(args.processes)]
+    try:
+        started = time.perf_counter()
+        with ProcessPoolExecutor(args.processes) as pool:
+            results = list(pool.map(run_process, jobs))
+        elapsed = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    latencies, errors = defaultdict(list), defaultdict(int)
+    for process_latencies, process_errors in results:
+        for operation, values in process_latencies.items():
+            latencies[operation].extend(values)
+        for operation, count in process_errors.items():
+            errors[operation] += count
+    operations = {operation: latency_summary(values, elapsed, errors.get(operation, 0))
+                  for operation, values in sorted(latencies.items())}
+    total = latency_summary([value for values in latencies.values() for value in values], elapsed,
+                            sum(errors.values()))
+
+    print(f"{total['count']} requests in {elapsed:.2f}s ({total['per_sec']:.0f} req/s, {total['errors']} errors) "
+          f"with {args.processes} processes x {args.threads} users via {args.driver}")
+    print(f"{'operation':<14}{'count':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for operation, summary in list(operations.items()) + [('total', total)]:
+        print(f"{operation:<14}{summary['count']:>7}{summary['errors']:>8}{summary['per_sec']:>9.1f}"
+              f"{summary['p50_ms']:>9.1f}{summary['p95_ms']:>9.1f}{summary['p99_ms']:>9.1f}")
+
+    interest = None
+    if not args.skip_interest:
+        with app.app_context():
+            stats = apply_interest()
+        interest = {'accounts': stats['accounts'], 'seconds': round(stats['seconds'], 3),
+                    'accounts_per_sec': round(stats['accounts_per_sec'], 1)}
+
+    config = {key: value for key, value in vars(args).items() if key not in ('output', 'database', 'url')}
+    path = write_results('workload', {'config': config, 'seed': seeded['counts'], 'elapsed_seconds': round(elapsed, 3),
+                                      'operations': operations, 'total': total, 'interest': interest}, args.output)
+    print(f'Results written to {path}')
+
+
+if __name__ == '__main__':
+    main(_args)
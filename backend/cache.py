@@ -0,0 +1,202 @@
+"""Read-through cache backends for per-user page data.
+
+create_cache() picks a backend from a URL:
+
+* ``memory://`` - an LRU dict with per-entry TTL inside each process (the default).
+* ``redis://host:6379/0`` - a Redis server shared by all workers (needs the
+  ``redis`` package).
+* ``local://`` - an in-process stand-in with the same interface as the Redis
+  client, for development and for exercising the shared-cache code path.
+
+Every backend has get/set/delete/clear and a stats() dict with hit and miss
+counters for the current process. The Cache extension builds one backend per
+Flask app from its CACHE_* settings and forwards calls to the current app's.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+_MISSING = object()
+
+
+class _Counters:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.deletes = 0
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'sets': self.sets,
+            'deletes': self.deletes,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire `ttl` seconds after being set."""
+
+    def __init__(self, max_entries=10000, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = _Counters()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value, expires_at = self._entries.get(key, (_MISSING, 0))
+            if value is _MISSING or expires_at < time.monotonic():
+                if value is not _MISSING:
+                    del self._entries[key]
+                self._counters.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._counters.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._counters.sets += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+            self._counters.deletes += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters.as_dict(), backend='memory', entries=len(self._entries))
+
+
+class LocalSharedClient:
+    """Dict-backed stand-in for the subset of the redis-py client that SharedCache uses."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            value, expires_at = self._data.get(name, (None, None))
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        with self._lock:
+            self._data[name] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._data.pop(name, None) is not None for name in names)
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SharedCache:
+    """Cache stored in an external key-value server, so every worker sees the same
+    entries and an invalidation in one worker applies to all of them."""
+
+    def __init__(self, client, ttl=30, prefix='bank:', backend='shared'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._counters = _Counters()
+
+    def get(self, key, default=None):
+        raw = self.client.get(self.prefix + key)
+        with self._lock:
+            if raw is None:
+                self._counters.misses += 1
+                return default
+            self._counters.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+        with self._lock:
+            self._counters.sets += 1
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+        with self._lock:
+            self._counters.deletes += len(keys)
+
+    def clear(self):
+        self.client.flushdb()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters.as_dict(), backend=self.backend)
+
+
+def create_cache(url, max_entries=10000, ttl=30):
+    """Build a cache backend from a URL such as memory://, local:// or redis://host/0."""
+    scheme = url.split('://', 1)[0]
+    if scheme == 'memory':
+        return TTLCache(max_entries=max_entries, ttl=ttl)
+    if scheme == 'local':
+        return SharedCache(LocalSharedClient(), ttl=ttl, backend='local')
+    if scheme in ('redis', 'rediss', 'unix'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(f'CACHE_URL {url!r} needs the redis package (pip install redis)')
+        return SharedCache(redis.Redis.from_url(url), ttl=ttl, backend='redis')
+    raise ValueError(f'Unsupported CACHE_URL scheme: {url!r}')
+
+
+class Cache:
+    """Flask extension: init_app(app) builds the app's backend with create_cache(),
+    and get/set/delete/clear/stats go to the backend of the current app."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['cache'] = create_cache(app.config['CACHE_URL'], max_entries=app.config['CACHE_MAX_ENTRIES'],
+                                               ttl=app.config['CACHE_TTL_SECONDS'])
+
+    @property
+    def backend(self):
+        return current_app.extensions['cache']
+
+    def get(self, key, default=None):
+        return self.backend.get(key, default)
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def delete(self, *keys):
+        self.backend.delete(*keys)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return self.backend.stats()
@@ -0,0 +1,256 @@
+"""Opt-in request profiling and SQL instrumentation for the Flask app.
+
+Instrumentation(app) hooks into the request cycle, SQLAlchemy and template
+rendering to record, per endpoint:
+
+* request latency, SQL statement count, SQL time and template render time
+  as histograms, served in Prometheus text format at /metrics to requests
+  carrying ``Authorization: Bearer <INSTRUMENTATION_TOKEN>``;
+* statements repeated many times in one request (the N+1 pattern from lazy
+  relationship loading), counted and logged with the offending SQL;
+* a cProfile dump for a sampled fraction of requests, or, with
+  PROFILE_ON_DEMAND, for a request with ``?_profile=1`` and the same token.
+
+Metrics live in process memory, in app.extensions['instrumentation'], so each
+gunicorn worker (and each app created in one process) reports its own.
+"""
+import hmac
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+from flask import abort, before_render_template, current_app, g, has_request_context, request, template_rendered, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+
+def _labels(labels):
+    return ','.join(f'{key}="{value}"' for key, value in labels)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{{{_labels(key + (("le", bound),))}}} {count}')
+                lines.append(f'{self.name}_bucket{{{_labels(key + (("le", "+Inf"),))}}} {series[-1]}')
+                lines.append(f'{self.name}_sum{{{_labels(key)}}} {series[-2]}')
+                lines.append(f'{self.name}_count{{{_labels(key)}}} {series[-1]}')
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{{{_labels(key)}}} {value}' if key else f'{self.name} {value}')
+        return lines
+
+
+class RequestMetrics:
+    """One app's metrics."""
+
+    def __init__(self):
+        self.request_duration = Histogram(
+            'bank_request_duration_seconds', 'Request latency by endpoint.', LATENCY_BUCKETS)
+        self.sql_statements = Histogram(
+            'bank_request_sql_statements', 'SQL statements executed per request.', COUNT_BUCKETS)
+        self.sql_duration = Histogram(
+            'bank_request_sql_seconds', 'Time spent in SQL per request.', LATENCY_BUCKETS)
+        self.template_duration = Histogram(
+            'bank_request_template_seconds', 'Template render time per request.', LATENCY_BUCKETS)
+        self.n_plus_one = CounterMetric(
+            'bank_n_plus_one_total', 'Requests that repeated one SQL statement N_PLUS_ONE_THRESHOLD or more times.')
+
+    def render(self):
+        lines = []
+        for metric in (self.request_duration, self.sql_statements, self.sql_duration,
+                       self.template_duration, self.n_plus_one):
+            lines.extend(metric.render())
+        return lines
+
+
+class Instrumentation:
+    def __init__(self, app=None):
+        self.collectors = []
+        self._engine_events = False
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('N_PLUS_ONE_THRESHOLD', 5)
+        app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+        app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+        app.config.setdefault('PROFILE_ON_DEMAND', False)
+        app.config.setdefault('INSTRUMENTATION_TOKEN', None)
+        app.extensions['instrumentation'] = RequestMetrics()
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        # Engine events are process-wide, so they are registered once however many apps
+        # are created; statements only count towards a request that is instrumented
+        with self._lock:
+            if not self._engine_events:
+                event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+                event.listen(Engine, 'handle_error', self._handle_error)
+                self._engine_events = True
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def add_collector(self, collector):
+        """Register a callable returning extra Prometheus text lines for /metrics."""
+        self.collectors.append(collector)
+
+    # Request cycle
+
+    def _before_request(self):
+        g.instrumentation = {
+            'started': time.perf_counter(),
+            'sql_count': 0,
+            'sql_time': 0.0,
+            'statements': Counter(),
+            'template_time': 0.0,
+            'template_started': [],
+            'profiler': None,
+        }
+        rate = current_app.config['PROFILE_SAMPLE_RATE']
+        on_demand = (request.args.get('_profile') == '1' and current_app.config['PROFILE_ON_DEMAND']
+                     and self._has_token())
+        if on_demand or (rate and random.random() < rate):
+            import cProfile # Only loaded once a request is actually profiled
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError: # Another thread's request is already being profiled
+                return
+            g.instrumentation['profiler'] = profiler
+
+    def _after_request(self, response):
+        stats = g.get('instrumentation')
+        if stats is not None:
+            elapsed = time.perf_counter() - stats['started']
+            response.headers['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.1f}, '
+                f'db;dur={stats["sql_time"] * 1000:.1f};desc="{stats["sql_count"]} queries", '
+                f'tpl;dur={stats["template_time"] * 1000:.1f}'
+            )
+        return response
+
+    def _teardown_request(self, exc):
+        stats = g.pop('instrumentation', None)
+        if stats is None:
+            return
+        endpoint = request.endpoint or 'unknown'
+        if stats['profiler'] is not None:
+            stats['profiler'].disable()
+            self._dump_profile(stats['profiler'], endpoint)
+        metrics = current_app.extensions['instrumentation']
+        metrics.request_duration.observe(time.perf_counter() - stats['started'], endpoint=endpoint)
+        metrics.sql_statements.observe(stats['sql_count'], endpoint=endpoint)
+        metrics.sql_duration.observe(stats['sql_time'], endpoint=endpoint)
+        metrics.template_duration.observe(stats['template_time'], endpoint=endpoint)
+
+        threshold = current_app.config['N_PLUS_ONE_THRESHOLD']
+        repeated = [(statement, count) for statement, count in stats['statements'].items() if count >= threshold]
+        if repeated:
+            metrics.n_plus_one.inc(endpoint=endpoint)
+            for statement, count in repeated:
+                current_app.logger.warning('Possible N+1 in %s: %d executions of %s',
+                                        endpoint, count, ' '.join(statement.split())[:300])
+
+    def _dump_profile(self, profiler, endpoint):
+        directory = current_app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{endpoint}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.prof')
+        profiler.dump_stats(path)
+        current_app.logger.info('Wrote profile for %s to %s', endpoint, path)
+
+    # SQL and templates
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('instrumentation_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['instrumentation_started'].pop()
+        if not has_request_context():
+            return
+        stats = g.get('instrumentation')
+        if stats is not None:
+            stats['sql_count'] += 1
+            stats['sql_time'] += time.perf_counter() - started
+            stats['statements'][statement] += 1
+
+    def _handle_error(self, exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('instrumentation_started'):
+            connection.info['instrumentation_started'].pop()
+
+    def _before_render(self, sender, template, context, **extra):
+        stats = g.get('instrumentation')
+        if stats is not None:
+            stats['template_started'].append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        stats = g.get('instrumentation')
+        if stats is not None and stats['template_started']:
+            stats['template_time'] += time.perf_counter() - stats['template_started'].pop()
+
+    # Exposition
+
+    def _has_token(self):
+        # Profiles and metrics reveal timings and SQL, so both need the operator's token
+        token = current_app.config['INSTRUMENTATION_TOKEN']
+        supplied = request.headers.get('Authorization', '')
+        return bool(token) and hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode())
+
+    def render_metrics(self):
+        """The current app's metrics and every collector's lines, in Prometheus text format."""
+        lines = current_app.extensions['instrumentation'].render()
+        for collector in self.collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        if not current_app.config['INSTRUMENTATION_TOKEN']:
+            abort(404)
+        if not self._has_token():
+            abort(401)
+        return Response(self.render_metrics(), mimetype='text/plain; version=0.0.4')